@@ -1,14 +1,214 @@
 import os
+import re
+import glob
+import hashlib
+import tempfile
+import time
+import warnings
+from copy import copy
+from datetime import datetime
+from functools import lru_cache, partial
+import numpy as np
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from indicators import Indicator, CATEGORIES, get_indicators
+from metrics import Metrics, timed
+
+
+# columns identifying a single district month, shared by every indicator
+KEYS = ['Region', 'District', 'Year', 'Month']
+
+# month labels used in the dashboard's column headers, in calendar order
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+# data types of the key columns. Region and District categories are unified across all loaded files, the ordered Month categorical is stored as int8 codes
+KEY_DTYPES = {
+    'Region': 'category',
+    'District': 'category',
+    'Year': 'int16',
+    'Month': pd.CategoricalDtype(MONTHS, ordered=True),
+}
+
+
+# ways of resolving several rows of one indicator for the same key, see `deduplicate`
+DEDUP_POLICIES = (None, 'first', 'last', 'mean')
+
+
+def schema(indicators=None) -> dict:
+    """
+    Return the declared data type of every column of the aggregated DataFrame: the key columns followed by the value column of each indicator in `indicators` (defaults to all merged indicators) with its registry dtype.
+    """
+
+    if indicators is None:
+        indicators = get_indicators(merge=True)
+
+    dtypes = dict(KEY_DTYPES)
+    for indicator in indicators:
+        dtypes[indicator.value_name] = indicator.dtype
+    return dtypes
+
+
+def unify_categories(dfs: list) -> None:
+    """
+    Give the Region and District columns of every DataFrame in `dfs` the same categories, in place, so that concatenating or merging them keeps the columns categorical.
+    """
+
+    for column in ['Region', 'District']:
+        categories = sorted(set().union(*(df[column].cat.categories for df in dfs)))
+        for df in dfs:
+            df[column] = df[column].cat.set_categories(categories)
+
+
+def memory_report(**dfs) -> pd.DataFrame:
+    """
+    Return the memory used by each column of every DataFrame passed as a keyword argument, in bytes and including the contents of Python objects. One column per DataFrame, plus a total row.
+    """
+
+    report = pd.DataFrame({name: df.memory_usage(index=False, deep=True) for name, df in dfs.items()})
+    report.loc['total'] = report.sum()
+    return report
+
+
+def snapshot_date(file_name: str):
+    """
+    Return the half year snapshot date in a scraped CSV file name, e.g. 28-Jun-2015 for 'climate-cdi-28-Jun-2015.csv'. None if the name has no date.
+    """
+
+    match = re.search(r'\d{2}-[A-Z][a-z]{2}-\d{4}', file_name)
+    if match is None:
+        return None
+    return datetime.strptime(match.group(0), '%d-%b-%Y')
+
+
+@lru_cache(maxsize=None)
+def parse_date_label(label: str) -> tuple:
+    """
+    Return the Month code (position in `MONTHS`) and Year of a dashboard column header such as 'Jul-2015'. Cached, so every distinct header is only parsed once across all files.
+    """
+
+    month, year = label.split('-')
+    return MONTHS.index(month), int(year)
+
+
+def parse_numeric(series, dtype='float64'):
+    """
+    Return `series` as numbers of type `dtype`. String values have their thousands separators removed with vectorized string operations first. Numeric series are only cast.
+    """
+
+    if not pd.api.types.is_numeric_dtype(series):
+        series = pd.to_numeric(series.astype('string').str.replace(',', '', regex=False))
+    return series.astype(dtype)
+
+
+def deduplicate(df, policy='last'):
+    """
+    Return `df` with one row per (Region, District, Year, Month) key and no rows with a missing key. Where a key has several rows, keep the 'first' or 'last' of them (in file order, so 'last' is the most recent snapshot), or their 'mean'. Means of integer columns are rounded to keep their type.
+    """
+
+    df = df.dropna(subset=KEYS)
+    if policy in ('first', 'last'):
+        return df.drop_duplicates(subset=KEYS, keep=policy)
+    if policy != 'mean':
+        raise ValueError(f"Unknown dedup policy '{policy}', expected one of {DEDUP_POLICIES[1:]}.")
+
+    if not df.duplicated(subset=KEYS).any():
+        return df
+    dtypes = df.dtypes
+    means = df.groupby(KEYS, observed=True, sort=False).mean().reset_index()
+    for column in means.columns:
+        if column not in KEYS and pd.api.types.is_integer_dtype(dtypes[column]):
+            means[column] = means[column].round()
+    return means.astype(dtypes.to_dict())[list(df.columns)]
+
+
+def to_long(df, value_name, dtype='float32'):
+    """
+    Convert a wide dashboard table `df` (Region, District and one column per 'Mon-YYYY' month, without the '#' column and empty first row) to long format. Return a DataFrame with the key columns typed as declared in `KEY_DTYPES` and the values, parsed as numbers of type `dtype`, in the `value_name` column.
+
+    Month and Year are built from the parsed column headers rather than split row by row.
+    """
+
+    # parse each date header once, then repeat its codes for every district
+    date_columns = [column for column in df.columns if column not in ('Region', 'District')]
+    month_codes, years = zip(*(parse_date_label(column) for column in date_columns))
+    n_districts = len(df)
+
+    # one block of districts per date column (same row order as pd.melt)
+    df_long = pd.DataFrame({
+        'Region': np.tile(df['Region'].to_numpy(), len(date_columns)),
+        'District': np.tile(df['District'].to_numpy(), len(date_columns)),
+        value_name: parse_numeric(pd.concat([df[column] for column in date_columns], ignore_index=True), dtype),
+        'Month': pd.Categorical.from_codes(np.repeat(month_codes, n_districts), dtype=KEY_DTYPES['Month']),
+        'Year': np.repeat(np.array(years, dtype=KEY_DTYPES['Year']), n_districts),
+    })
+    return df_long.astype({'Region': KEY_DTYPES['Region'], 'District': KEY_DTYPES['District']})
 
 
 class Aggregator:
     """
     Combine separate CSV files into one aggregated DataFrame using the specified join method. Defaults to outer.
+
+    The indicators that are combined, and the directories inside `data_dir` that their CSV files are read from, come from the registry in `indicators.py`.
+
+    Indicators are combined with chained `pd.merge` calls by default (`assembly='merge'`). With `assembly='index'` every indicator is instead aligned on one (Region, District, Year, Month) index in a single step. Index assembly keeps one row per district month: where an indicator has several rows for the same key (overlapping half year files) the one from the most recent file is used, while chained merges repeat the row for every combination.
+
+    With `assembly='grid'` the files are not melted or joined at all: their values are copied straight into one dense district x month x indicator array (see `self.assemble_grid`), which is only turned into a DataFrame at the end. The result is the same as index assembly.
+
+    CSV files are loaded one at a time by default. With `workers` greater than 1 every file of every indicator is loaded concurrently, in a pool of `workers` processes (`executor='process'`) or threads (`executor='thread'`), before any merging starts. The result is the same either way.
+
+    `self.write_partitioned` rebuilds the merged data one Region (or Year) partition at a time into a partitioned Parquet dataset, so peak memory is bounded by the largest partition rather than the whole history. `self.read_partitioned` reads it back.
+
+    `self.query` declares the columns, years, regions and non-null requirement a caller needs up front and returns a lazy `DatasetQuery`, which only opens the indicator directories and files it needs when collected.
+
+    `self.load_combined` reads the merged data from a typed Parquet or Feather cache, rebuilding it with `self.merge_data` only when the source CSV files change.
+
+    Overlapping half year files give some indicators several rows for the same key (the December of the previous year appears in two files). Chained merges repeat each of those rows for every matching row of the other indicators, multiplying the rows at every step. The `dedup` policy ('first', 'last' or 'mean', see `deduplicate`) resolves them before merging, keeping the last row per key by default: every merge is then checked to be one-to-one and the merged data has one row per district month. Pass `dedup=None` to keep the legacy behavior of repeating rows; a warning then names the indicators with duplicate keys. Index and grid assembly always keep one row per key, 'last' unless another policy is passed (grid assembly only supports 'last').
+
+    Pass a `store.SQLiteStore` as `store` to read every indicator from the consolidated store instead of its CSV files. The store holds one row per district month, so chained merges no longer repeat rows. Grid assembly reads CSV files, so with a store it falls back to index assembly, which gives the same result.
+
+    Pass a `metrics.Metrics` object as `metrics` to record the load time and rows of every CSV file and the rows in and out and time of every merge step.
     """
 
-    def __init__(self, join_method='outer') -> None:
+    def __init__(self, join_method='outer', data_dir='data', workers=1, executor='process', assembly='merge', metrics=None, store=None, dedup='last') -> None:
+        if executor not in ('process', 'thread'):
+            raise ValueError(f"Unknown executor '{executor}', expected 'process' or 'thread'.")
+        if assembly not in ('merge', 'index', 'grid'):
+            raise ValueError(f"Unknown assembly '{assembly}', expected 'merge', 'index' or 'grid'.")
+        if dedup not in DEDUP_POLICIES:
+            raise ValueError(f"Unknown dedup policy '{dedup}', expected one of {DEDUP_POLICIES}.")
+        if assembly == 'grid' and dedup not in (None, 'last'):
+            raise ValueError(f"Grid assembly always keeps the last row per key, it cannot use the '{dedup}' dedup policy.")
+
         self.join_method = join_method
+        self.data_dir = data_dir
+        self.workers = workers
+        self.executor = executor
+        self.assembly = assembly
+        self.metrics = metrics if metrics is not None else Metrics(enabled=False)
+        self.store = store
+        self.dedup = dedup
+
+
+    def query(self, columns=None, years=None, regions=None, dropna=False):
+        """
+        Return a lazy `DatasetQuery` over the merged data. Nothing is loaded until its `collect` method is called.
+
+        ARGUMENTS:
+
+        `columns`:
+            Indicator columns to include, e.g. ['Arrivals', 'Rainfall']. The key columns are always included. Defaults to every merged indicator.
+
+        `years`:
+            Optional collection of years to keep, e.g. range(2018, 2024).
+
+        `regions`:
+            Optional collection of regions to keep.
+
+        `dropna`:
+            If `True` only rows with a value for every requested column are kept.
+        """
+
+        return DatasetQuery(self, columns=columns, years=years, regions=regions, dropna=dropna)
 
 
     def merge_data(self):
@@ -16,40 +216,330 @@ class Aggregator:
         Merge all data into one DataFrame using specified join method. Return this DataFrame.
         """
 
-        climate_df = self.aggregate_climate()
-        print('merged climate data')
-        conflict_df = self.aggregate_conflicts()
-        df = pd.merge(climate_df, conflict_df, on=['Region', 'District', 'Year', 'Month'], how=self.join_method)
-        print('merged conflict data')
+        if self.assembly == 'grid' and self.store is None:
+            df = self.assemble_grid(get_indicators(merge=True))
+            print('assembled all data')
+            return df
+
+        # load every indicator up front so a worker pool can read all files at once
+        indicator_dfs = self.aggregate_indicators(get_indicators(merge=True))
+        return self.combine(indicator_dfs)
+
+
+    def combine(self, indicator_dfs: dict, verbose=True):
+        """
+        Combine the long format DataFrames of indicators, passed as a dict keyed by indicator, into one DataFrame with the specified assembly and join method. Indicators are combined in registry order. Return this DataFrame.
+        """
+
+        # grid assembly gives the same result as index assembly on already loaded frames
+        if self.assembly in ('index', 'grid'):
+            df = self.assemble_frames(list(indicator_dfs.values()))
+            if verbose:
+                print('assembled all data')
+            return df
+
+        df = None
+        for category in CATEGORIES:
+            indicators = [indicator for indicator in get_indicators(category) if indicator in indicator_dfs]
+            if not indicators:
+                continue
+
+            category_df = self.merge_frames([indicator_dfs[indicator] for indicator in indicators])
+            rows_before = 0 if df is None else len(df)
+            if df is None:
+                df = category_df
+            else:
+                df = self.merge_pair(df, category_df, step=category)
+            if verbose:
+                print(f'merged {category} data ({len(df):,} rows, {len(df) - rows_before:+,})')
+
+        return df
+
+
+    def merge_frames(self, dfs: list):
+        """
+        Merge the long format DataFrames in `dfs`, in order, into one DataFrame using the specified join method. Return this DataFrame.
+        """
+
+        dfs = [self.unique_keys(df) for df in dfs]
+
+        df = dfs[0]
+        for other_df in dfs[1:]:
+            df = self.merge_pair(df, other_df)
+
+        return df
+
+
+    def unique_keys(self, df):
+        """
+        Check the long format DataFrame `df` for duplicate and missing (Region, District, Year, Month) keys, recording their number. Return `df` deduplicated with `self.dedup`, or unchanged with a warning if there is no dedup policy and the keys are not unique.
+        """
+
+        value_columns = ', '.join(column for column in df.columns if column not in KEYS)
+        duplicates = int(df.duplicated(subset=KEYS).sum())
+        missing = int(df[KEYS].isna().any(axis=1).sum())
+        self.metrics.record('keys', step=value_columns, rows=len(df), duplicate_keys=duplicates, missing_keys=missing)
+
+        if self.dedup is None:
+            if duplicates or missing:
+                warnings.warn(f'{value_columns} has {duplicates} duplicate and {missing} missing keys, merges will repeat rows. Pass a dedup policy to the Aggregator to resolve them.', stacklevel=2)
+            return df
+
+        return deduplicate(df, self.dedup)
+
+
+    def merge_pair(self, df, other_df, step=None):
+        """
+        Merge `other_df` into `df` on the key columns using the specified join method, recording the rows in and out and the time taken. `step` names the merge in the recorded event and defaults to the value columns of `other_df`.
+        """
+
+        if step is None:
+            step = ', '.join(column for column in other_df.columns if column not in KEYS)
+
+        # with deduplicated keys every merge must be one to one, anything else is a bug
+        validate = 'one_to_one' if self.dedup is not None else None
+        with self.metrics.timer('merge', step=step, rows_left=len(df), rows_right=len(other_df)) as event:
+            df = pd.merge(df, other_df, on=KEYS, how=self.join_method, validate=validate)
+            event['rows_out'] = len(df)
+            event['rows_added'] = len(df) - event['rows_left']
+
+        return df
+
+
+    def assemble_frames(self, dfs: list):
+        """
+        Align the long format DataFrames in `dfs` on one shared (Region, District, Year, Month) index in a single concat, instead of chained merges. Return the combined DataFrame with the key columns first.
+
+        Each DataFrame keeps only its last row per key, or the row chosen by `self.dedup` if it is 'first' or 'mean'. The keys kept follow the join method: all keys for 'outer', shared keys for 'inner', and the keys of the first or last DataFrame for 'left' or 'right'.
+        """
 
-        health_df = self.aggregate_health()
-        df = pd.merge(df, health_df, on=['Region', 'District', 'Year', 'Month'], how=self.join_method)
-        print('merged health data')
+        start = time.perf_counter()
+        rows_in = sum(len(df) for df in dfs)
+
+        series = []
+        for df in dfs:
+            if self.dedup in ('first', 'mean'):
+                df = deduplicate(df, self.dedup)
+            indexed = df.set_index(KEYS)
+            indexed = indexed[~indexed.index.duplicated(keep='last')]
+            series.extend(indexed[column] for column in indexed.columns)
+
+        if self.join_method in ('outer', 'inner'):
+            df = pd.concat(series, axis='columns', join=self.join_method)
+        elif self.join_method == 'left':
+            df = pd.concat(series, axis='columns', join='outer').reindex(series[0].index)
+        elif self.join_method == 'right':
+            df = pd.concat(series, axis='columns', join='outer').reindex(series[-1].index)
+        else:
+            raise ValueError(f"Join method '{self.join_method}' is not supported by index assembly.")
+
+        df = df.sort_index().reset_index()
+        for column, dtype in KEY_DTYPES.items():
+            if dtype != 'category' or not isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype(dtype)
+
+        self.metrics.record('assemble', method='index', rows_in=rows_in, rows_out=len(df), seconds=time.perf_counter() - start)
+        return df
 
-        # malnutrition_df = self.aggregate_malnutrition()
-        # df = pd.merge(df, malnutrition_df, on=['Region', 'District', 'Year', 'Month'], how=self.join_method)
-        # print('merged malnutrition data')
 
-        market_df = self.aggregate_markets()
-        df = pd.merge(df, market_df, on=['Region', 'District', 'Year', 'Month'], how=self.join_method)
-        print('merged market data')
+    def assemble_grid(self, indicators: list):
+        """
+        Combine every indicator in `indicators` through one dense NumPy array of shape (districts, months, indicators). Return the combined DataFrame, identical to index assembly.
 
-        movement_df = self.aggregate_movements()
-        df = pd.merge(df, movement_df, on=['Region', 'District', 'Year', 'Month'], how=self.join_method)
-        print('merged movement data')
+        Every CSV file covers the same districts for a run of consecutive months ending at the file's snapshot date, so each file is copied into the array with a single slice: its rows are looked up in a precomputed district index and its columns start at the month ordinal derived from the file name. Files are written oldest snapshot first, so overlapping months keep the most recent value. Rows are kept according to the join method, as in `self.assemble_frames`.
+        """
 
+        jobs = [(position, file_path) for position, indicator in enumerate(indicators) for file_path in self.indicator_files(indicator)]
+        file_paths = [file_path for _, file_path in jobs]
+        if self.workers > 1:
+            pool = ProcessPoolExecutor if self.executor == 'process' else ThreadPoolExecutor
+            with pool(max_workers=self.workers) as executor:
+                timed_loads = list(executor.map(partial(timed, self.load_grid_file), file_paths))
+        else:
+            timed_loads = [timed(self.load_grid_file, file_path) for file_path in file_paths]
+
+        grids = []
+        for file_path, (grid, seconds) in zip(file_paths, timed_loads):
+            self.metrics.record('load', file=file_path, rows=len(grid[0]) * grid[3].shape[1], seconds=seconds)
+            grids.append(grid)
+
+        assemble_start = time.perf_counter()
+
+        # precompute the district and month indexes covering every file
+        districts = pd.MultiIndex.from_tuples(sorted(set().union(*(zip(regions, file_districts) for regions, file_districts, _, _ in grids))), names=['Region', 'District'])
+        first_month = min(last_month - values.shape[1] + 1 for _, _, last_month, values in grids)
+        last_month = max(last_month for _, _, last_month, _ in grids)
+
+        values = np.full((len(districts), last_month - first_month + 1, len(indicators)), np.nan)
+        present = np.zeros(values.shape, dtype=bool)
+        for (position, _), (regions, file_districts, file_last_month, file_values) in zip(jobs, grids):
+            rows = districts.get_indexer(pd.MultiIndex.from_arrays([regions, file_districts]))
+            start = file_last_month - file_values.shape[1] + 1 - first_month
+            values[rows, start:start + file_values.shape[1], position] = file_values
+            present[rows, start:start + file_values.shape[1], position] = True
+
+        if self.join_method == 'outer':
+            keep = present.any(axis=2)
+        elif self.join_method == 'inner':
+            keep = present.all(axis=2)
+        elif self.join_method == 'left':
+            keep = present[:, :, 0]
+        elif self.join_method == 'right':
+            keep = present[:, :, -1]
+        else:
+            raise ValueError(f"Join method '{self.join_method}' is not supported by grid assembly.")
+
+        # only now build the DataFrame, from the kept cells in (district, month) order
+        district_rows, month_columns = np.nonzero(keep)
+        months = month_columns + first_month
+        df = pd.DataFrame({
+            'Region': districts.get_level_values('Region')[district_rows],
+            'District': districts.get_level_values('District')[district_rows],
+            'Year': months // 12,
+            'Month': pd.Categorical.from_codes(months % 12, dtype=KEY_DTYPES['Month']),
+        })
+        for position, indicator in enumerate(indicators):
+            df[indicator.value_name] = pd.Series(values[district_rows, month_columns, position]).astype(indicator.dtype)
+
+        for column, dtype in KEY_DTYPES.items():
+            if column != 'Month':
+                df[column] = df[column].astype(dtype)
+
+        self.metrics.record('assemble', method='grid', rows_in=sum(len(grid[0]) * grid[3].shape[1] for grid in grids), rows_out=len(df), seconds=time.perf_counter() - assemble_start)
         return df
 
 
+    def load_grid_file(self, df_path) -> tuple:
+        """
+        Read the CSV file passed as df_path without converting it to long format. Return its regions, districts, the month ordinal (year * 12 + month - 1) of its last column, taken from the snapshot date in the file name, and its values as a 2D float array.
+        """
+
+        df = pd.read_csv(df_path, thousands=',')
+        df.drop(labels=0, axis='index', inplace=True)
+        df.drop(labels='#', axis='columns', inplace=True)
+
+        snapshot = snapshot_date(os.path.basename(df_path))
+        last_month = snapshot.year * 12 + snapshot.month - 1
+        values = df.drop(columns=['Region', 'District']).to_numpy(dtype='float64')
+
+        return df['Region'].to_numpy(), df['District'].to_numpy(), last_month, values
+
+
+    def merge_indicators(self, indicators: list):
+        """
+        Load every indicator in `indicators` and merge them, in order, into one DataFrame using the specified join method. Return this DataFrame.
+        """
+
+        if self.assembly == 'grid' and self.store is None:
+            return self.assemble_grid(indicators)
+
+        indicator_dfs = self.aggregate_indicators(indicators)
+        dfs = [indicator_dfs[indicator] for indicator in indicators]
+        if self.assembly == 'index':
+            return self.assemble_frames(dfs)
+        return self.merge_frames(dfs)
+
+
+    def aggregate_indicators(self, indicators: list, years=None) -> dict:
+        """
+        Combine the CSV files of every indicator in `indicators` into one long format DataFrame per indicator. Return a dict of DataFrames keyed by indicator.
+
+        Files are loaded in a worker pool if `self.workers` is greater than 1. If `years` is passed, files without data for any of those years are skipped (see `self.indicator_files`).
+
+        With a `store`, each indicator is read from the store instead (only the rows of `years` if passed).
+        """
+
+        if self.store is not None:
+            indicator_dfs = {}
+            for indicator in indicators:
+                indicator_dfs[indicator], seconds = timed(self.store.read, indicator, years)
+                self.metrics.record('load', file=self.store.path, indicator=indicator.key, rows=len(indicator_dfs[indicator]), seconds=seconds)
+            unify_categories(list(indicator_dfs.values()))
+            return indicator_dfs
+
+        # list every file to load
+        jobs = []
+        for indicator in indicators:
+            for file_path in self.indicator_files(indicator, years=years):
+                jobs.append((indicator, file_path))
+
+        file_paths = [file_path for _, file_path in jobs]
+        value_names = [indicator.value_name for indicator, _ in jobs]
+        dtypes = [indicator.dtype for indicator, _ in jobs]
+        if self.workers > 1:
+            pool = ProcessPoolExecutor if self.executor == 'process' else ThreadPoolExecutor
+            with pool(max_workers=self.workers) as executor:
+                timed_loads = list(executor.map(partial(timed, self.load_dataframe), file_paths, value_names, dtypes))
+        else:
+            timed_loads = [timed(self.load_dataframe, file_path, value_name, dtype) for file_path, value_name, dtype in zip(file_paths, value_names, dtypes)]
+
+        # file load times are measured where the file was loaded, possibly in a worker process
+        loaded = []
+        for file_path, (df, seconds) in zip(file_paths, timed_loads):
+            self.metrics.record('load', file=file_path, rows=len(df), seconds=seconds)
+            loaded.append(df)
+
+        # share one set of Region and District categories between all files so merges keep them categorical
+        unify_categories(loaded)
+
+        # concatenate each indicator's files in snapshot order
+        indicator_dfs = {}
+        for indicator in indicators:
+            dfs = [df for (job_indicator, _), df in zip(jobs, loaded) if job_indicator == indicator]
+            indicator_dfs[indicator] = pd.concat(dfs, ignore_index=True)
+
+        return indicator_dfs
+
+
+    def indicator_files(self, indicator: Indicator, years=None) -> list:
+        """
+        Return the paths of all CSV files of `indicator`, oldest half year snapshot first.
+
+        If `years` is passed, only files that can hold data for one of those years are returned. A 28-Dec file covers July to December of its year, a 28-Jun file covers the first half of its year and may start in the previous December.
+        """
+
+        indicator_path = os.path.join(self.data_dir, indicator.output_dir)
+        file_names = sorted(os.listdir(indicator_path), key=lambda file_name: (snapshot_date(file_name) or datetime.min, file_name))
+
+        if years is not None:
+            years = set(years)
+            kept = []
+            for file_name in file_names:
+                snapshot = snapshot_date(file_name)
+                covered = {snapshot.year, snapshot.year - 1} if snapshot is not None and snapshot.month == 6 else {snapshot.year} if snapshot is not None else None
+                if covered is None or covered & years:
+                    kept.append(file_name)
+            file_names = kept
+
+        return [os.path.join(indicator_path, file_name) for file_name in file_names]
+
+
+    def aggregate_indicator(self, indicator: Indicator):
+        """
+        Combine all CSV files of a single indicator into one long format DataFrame. Return the combined DataFrame.
+        """
+
+        return self.aggregate_indicators([indicator])[indicator]
+
+
+    def aggregate_category(self, category: str):
+        """
+        Combine all data of a registered category (see `indicators.CATEGORIES`) into one DataFrame. Return the combined DataFrame.
+        """
+
+        return self.merge_indicators(get_indicators(category))
+
 
-    def load_dataframe(self, df_path, value_name):
+    def load_dataframe(self, df_path, value_name, dtype='float32'):
         """
         Read in and return a DataFrame for the CSV file passed as df_path. 
+            - Parses the data values as numbers while reading, removing thousands separators
             - Drop the first row (which seems to always be NaNs)
-            - Converts the DataFrame to long format by adding a column for the data values passed in value_name arg
+            - Converts the DataFrame to long format by adding a column for the data values passed in value_name arg, of type dtype
+            - Key columns get the types declared in `KEY_DTYPES`, Month and Year are built from the parsed column headers rather than split row by row
         """
 
-        df = pd.read_csv(df_path)
+        df = pd.read_csv(df_path, thousands=',')
 
         # drop first row (which is all NA values)
         df.drop(labels=0, axis='index', inplace=True)
@@ -57,20 +547,7 @@ class Aggregator:
         # drop extra label column
         df.drop(labels='#', axis='columns', inplace=True)
 
-        # convert data to long format
-        df_long = pd.melt(df, id_vars=['Region', 'District'], var_name='Date', value_name=value_name)
-
-        # split date into Month and Year columns
-        df_long[['Month', 'Year']] = df_long['Date'].str.split('-', expand=True)
-        df_long.drop(labels='Date', axis='columns', inplace=True)
-
-        # change column data types
-        df_long['Year'] = pd.to_numeric(df_long['Year'])
-        df_long['Month'] = df_long['Month'].astype('category')
-        df_long['Region'] = df_long['Region'].astype('category')
-        df_long['District'] = df_long['District'].astype('category')
-
-        return df_long
+        return to_long(df, value_name, dtype)
 
 
     def aggregate_climate(self):
@@ -78,295 +555,282 @@ class Aggregator:
         Combine all climate data into one DataFrame. Return the combined DataFrame.
         """
 
-        # aggregate cdi data
-        cdi_path = 'data/climate/cdi'
-        cdi_dfs = []
-        for file_name in os.listdir(cdi_path):
-            file_path = os.path.join(cdi_path, file_name)
-            df = self.load_dataframe(file_path, 'CDI')
-            cdi_dfs.append(df)
-
-        combined_cdi = pd.concat(cdi_dfs, ignore_index=True)
-
-        # aggregate ndvi data
-        ndvi_path = 'data/climate/ndvi'
-        ndvi_dfs = []
-        for file_name in os.listdir(ndvi_path):
-            file_path = os.path.join(ndvi_path, file_name)
-            df = self.load_dataframe(file_path, 'NDVI')
-            ndvi_dfs.append(df)
-
-        combined_ndvi = pd.concat(ndvi_dfs, ignore_index=True)
-
-        # merge dataframes
-        climate_df = pd.merge(combined_cdi, combined_ndvi, on=['Region', 'District', 'Year', 'Month'], how=self.join_method)
-
-        # aggregate rainfall data
-        rainfall_path = 'data/climate/rainfall'
-        rainfall_dfs = []
-        for file_name in os.listdir(rainfall_path):
-            file_path = os.path.join(rainfall_path, file_name)
-            df = self.load_dataframe(file_path, 'Rainfall')
-            rainfall_dfs.append(df)
-
-        combined_rainfall = pd.concat(rainfall_dfs, ignore_index=True)
-
-        # merge dataframes
-        climate_df = pd.merge(climate_df, combined_rainfall, on=['Region', 'District', 'Year', 'Month'], how=self.join_method)
-
-        # aggregate water price data
-        wp_path = 'data/climate/water-price'
-        wp_dfs = []
-        for file_name in os.listdir(wp_path):
-            file_path = os.path.join(wp_path, file_name)
-            df = self.load_dataframe(file_path, 'Water Price')
-            wp_dfs.append(df)
-
-        combined_wp = pd.concat(wp_dfs, ignore_index=True)
-        
-        # merge dataframes
-        climate_df = pd.merge(climate_df, combined_wp, on=['Region', 'District', 'Year', 'Month'], how=self.join_method)
-        return climate_df
-    
+        return self.aggregate_category('climate')
+
 
     def aggregate_conflicts(self):
         """
         Combine all conflict data into one DataFrame. Return the combined DataFrame.
         """
 
-        # aggregate conflict fatality data
-        fatalities_path = 'data/conflicts/fatalities'
-        fatalities_dfs = []
-        for file_name in os.listdir(fatalities_path):
-            file_path = os.path.join(fatalities_path, file_name)
-            df = self.load_dataframe(file_path, 'Conflict Fatalities')
-            fatalities_dfs.append(df)
+        return self.aggregate_category('conflicts')
 
-        combined_fatality = pd.concat(fatalities_dfs, ignore_index=True)
 
-        # aggregate conflict incident data
-        incidents_path = 'data/conflicts/incidents'
-        incidents_dfs = []
-        for file_name in os.listdir(incidents_path):
-            file_path = os.path.join(incidents_path, file_name)
-            df = self.load_dataframe(file_path, 'Conflict Incidents')
-            incidents_dfs.append(df)
+    def aggregate_health(self):
+        """
+        Combine all health data into one DataFrame. Return the combined DataFrame.
+        """
 
-        combined_incidents = pd.concat(incidents_dfs, ignore_index=True)
+        return self.aggregate_category('health')
 
-        # merge dataframes
-        conflict_df = pd.merge(combined_fatality, combined_incidents, on=['Region', 'District', 'Year', 'Month'], how=self.join_method)
-        return conflict_df
 
+    def aggregate_malnutrition(self):
+        """
+        Combine all malnutrition data into one DataFrame. Return the combined DataFrame.
+        """
 
-    def aggregate_health(self):
+        return self.aggregate_category('nutrition')
+
+
+    def aggregate_markets(self):
         """
-        Combine all health data into one DataFrame. Return the combined DataFrame.
+        Combine all market data into one DataFrame. Return the combined DataFrame.
         """
 
-        # aggregate cholera cases data
-        cholera_cases_path = 'data/health/cholera-cases'
-        cholera_cases_dfs = []
-        for file_name in os.listdir(cholera_cases_path):
-            file_path = os.path.join(cholera_cases_path, file_name)
-            df = self.load_dataframe(file_path, 'Cholera Cases')
-            cholera_cases_dfs.append(df)
+        return self.aggregate_category('market')
 
-        combined_cholera_cases = pd.concat(cholera_cases_dfs, ignore_index=True)
 
-        # aggregate cholera deaths data
-        cholera_deaths_path = 'data/health/cholera-deaths'
-        cholera_deaths_dfs = []
-        for file_name in os.listdir(cholera_deaths_path):
-            file_path = os.path.join(cholera_deaths_path, file_name)
-            df = self.load_dataframe(file_path, 'Cholera Deaths')
-            cholera_deaths_dfs.append(df)
+    def aggregate_movements(self):
+        """
+        Combine all movement data into one DataFrame. Return the combined DataFrame.
+        """
 
-        combined_cholera_deaths = pd.concat(cholera_deaths_dfs, ignore_index=True)
+        return self.aggregate_category('movement')
 
-        # merge dataframes
-        health_df = pd.merge(combined_cholera_deaths, combined_cholera_cases, on=['Region', 'District', 'Year', 'Month'], how=self.join_method)
 
-        # aggregate malaria data
-        malaria_path = 'data/health/malaria'
-        malaria_dfs = []
-        for file_name in os.listdir(malaria_path):
-            file_path = os.path.join(malaria_path, file_name)
-            df = self.load_dataframe(file_path, 'Malaria')
-            malaria_dfs.append(df)
+    def source_fingerprint(self) -> str:
+        """
+        Return a hash of the contents and paths of every CSV file read by `self.merge_data` (or of the store, if there is one), together with the settings that change its output. Changes whenever the merged data would.
+        """
 
-        combined_malaria = pd.concat(malaria_dfs, ignore_index=True)
+        fingerprint = hashlib.sha256()
+        fingerprint.update(f'{self.join_method}|{self.assembly}|{self.dedup}'.encode())
+        if self.store is not None:
+            fingerprint.update(self.store.fingerprint().encode())
+            return fingerprint.hexdigest()
 
-        # merge dataframes
-        health_df = pd.merge(health_df, combined_malaria, on=['Region', 'District', 'Year', 'Month'], how=self.join_method)
+        for indicator in get_indicators(merge=True):
+            for file_path in self.indicator_files(indicator):
+                fingerprint.update(os.path.relpath(file_path, self.data_dir).encode())
+                with open(file_path, 'rb') as f:
+                    fingerprint.update(hashlib.sha256(f.read()).digest())
 
-        # aggregate measles data
-        measles_path = 'data/health/measles'
-        measles_dfs = []
-        for file_name in os.listdir(measles_path):
-            file_path = os.path.join(measles_path, file_name)
-            df = self.load_dataframe(file_path, 'Measles')
-            measles_dfs.append(df)
+        return fingerprint.hexdigest()
 
-        combined_measles = pd.concat(measles_dfs, ignore_index=True)
 
-        # merge dataframes
-        health_df = pd.merge(health_df, combined_measles, on=['Region', 'District', 'Year', 'Month'], how=self.join_method)
-        return health_df
+    def typed_frame(self, df):
+        """
+        Return a copy of the merged DataFrame `df` with typed columns: Region, District and Month as categories and every indicator as a number. Indicators loaded by `self.load_dataframe` are numeric already, any others have their thousands separators removed.
+        """
 
+        df = df.copy()
+        for column in df.columns:
+            if column in ('Region', 'District', 'Month'):
+                df[column] = df[column].astype('category')
+            elif column != 'Year' and not pd.api.types.is_numeric_dtype(df[column]):
+                df[column] = parse_numeric(df[column])
 
-    def aggregate_malnutrition(self):
+        return df
+
+
+    def write_cache(self, df=None, path='data/combined_data.parquet'):
         """
-        Combine all malnutrition data into one DataFrame. Return the combined DataFrame.
+        Write the typed merged DataFrame to a columnar cache file, Parquet or Feather depending on the extension of `path`, along with the fingerprint of its source files. Merges the data first if `df` is not passed. Return the typed DataFrame.
         """
 
-        # aggregate malnutrition data
-        malnutrition_path = 'data/malnutrition'
-        malnutrition_dfs = []
-        for file_name in os.listdir(malnutrition_path):
-            file_path = os.path.join(malnutrition_path, file_name)
-            df = self.load_dataframe(file_path, 'GAM')
-            malnutrition_dfs.append(df)
+        if df is None:
+            df = self.merge_data()
+        df = self.typed_frame(df).reset_index(drop=True)
 
-        combined_malnutrition = pd.concat(malnutrition_dfs, ignore_index=True)
-        return combined_malnutrition
+        if path.endswith('.feather'):
+            df.to_feather(path)
+        else:
+            df.to_parquet(path, index=False)
 
+        with open(f'{path}.fingerprint', 'w') as f:
+            f.write(self.source_fingerprint())
 
-    def aggregate_markets(self):
+        return df
+
+
+    def load_combined(self, path='data/combined_data.parquet', columns=None, rebuild=False):
         """
-        Combine all market data into one DataFrame. Return the combined DataFrame.
+        Return the merged data from the columnar cache at `path`. The cache is (re)built with `self.merge_data` first if it does not exist, its source files changed since it was written, or `rebuild` is True.
+
+        ARGUMENTS:
+
+        `path`:
+            Location of the cache file. Files ending in '.feather' are written as Feather, anything else as Parquet.
+
+        `columns`:
+            Optional list of columns to read, e.g. just the features a model needs. Defaults to all columns.
+
+        `rebuild`:
+            If `True` always rebuilds the cache.
+
+        RETURNS:
+            The typed merged DataFrame, limited to `columns` if passed.
         """
 
-        # aggregate cost of minimum basket data
-        cmb_path = 'data/markets/cost-min-basket'
-        cmb_dfs = []
-        for file_name in os.listdir(cmb_path):
-            file_path = os.path.join(cmb_path, file_name)
-            df = self.load_dataframe(file_path, 'Cost Min Basket')
-            cmb_dfs.append(df)
-
-        combined_cmb = pd.concat(cmb_dfs, ignore_index=True)
-
-        # aggregate goat price data
-        goat_path = 'data/markets/goat'
-        goat_dfs = []
-        for file_name in os.listdir(goat_path):
-            file_path = os.path.join(goat_path, file_name)
-            df = self.load_dataframe(file_path, 'Goat Price')
-            goat_dfs.append(df)
-
-        combined_goat = pd.concat(goat_dfs, ignore_index=True)
-
-        # merge dataframes
-        market_df = pd.merge(combined_cmb, combined_goat, on=['Region', 'District', 'Year', 'Month'], how=self.join_method)
-
-        # aggregate goat to cereal data
-        gtc_path = 'data/markets/goat-to-cereal'
-        gtc_dfs = []
-        for file_name in os.listdir(gtc_path):
-            file_path = os.path.join(gtc_path, file_name)
-            df = self.load_dataframe(file_path, 'Goat to Cereal')
-            gtc_dfs.append(df)
-
-        combined_gtc = pd.concat(gtc_dfs, ignore_index=True)
-
-        # merge dataframes
-        market_df = pd.merge(market_df, combined_gtc, on=['Region', 'District', 'Year', 'Month'], how=self.join_method)
-
-        # aggregate maize price data
-        maize_path = 'data/markets/maize'
-        maize_dfs = []
-        for file_name in os.listdir(maize_path):
-            file_path = os.path.join(maize_path, file_name)
-            df = self.load_dataframe(file_path, 'Maize Price')
-            maize_dfs.append(df)
-
-        combined_maize = pd.concat(maize_dfs, ignore_index=True)
-        
-        # merge dataframes
-        market_df = pd.merge(market_df, combined_maize, on=['Region', 'District', 'Year', 'Month'], how=self.join_method)
-
-        # aggregate rice price data
-        rice_path = 'data/markets/rice'
-        rice_dfs = []
-        for file_name in os.listdir(rice_path):
-            file_path = os.path.join(rice_path, file_name)
-            df = self.load_dataframe(file_path, 'Rice Price')
-            rice_dfs.append(df)
-
-        combined_rice = pd.concat(rice_dfs, ignore_index=True)
-
-        # merge dataframes
-        market_df = pd.merge(market_df, combined_rice, on=['Region', 'District', 'Year', 'Month'], how=self.join_method)
-
-        # aggregate sorghum price data
-        sorghum_path = 'data/markets/sorghum'
-        sorghum_dfs = []
-        for file_name in os.listdir(sorghum_path):
-            file_path = os.path.join(sorghum_path, file_name)
-            df = self.load_dataframe(file_path, 'Sorghum Price')
-            sorghum_dfs.append(df)
-
-        combined_sorghum = pd.concat(sorghum_dfs, ignore_index=True)
-
-        # merge dataframes
-        market_df = pd.merge(market_df, combined_sorghum, on=['Region', 'District', 'Year', 'Month'], how=self.join_method)
-
-        # aggregate wage price data
-        wage_path = 'data/markets/wage'
-        wage_dfs = []
-        for file_name in os.listdir(wage_path):
-            file_path = os.path.join(wage_path, file_name)
-            df = self.load_dataframe(file_path, 'Wage Price')
-            wage_dfs.append(df)
-
-        combined_wage = pd.concat(wage_dfs, ignore_index=True)
-
-        # merge dataframes
-        market_df = pd.merge(market_df, combined_wage, on=['Region', 'District', 'Year', 'Month'], how=self.join_method)
-
-        # aggregate wage to cereal data
-        wtc_path = 'data/markets/wage-to-cereal'
-        wtc_dfs = []
-        for file_name in os.listdir(wtc_path):
-            file_path = os.path.join(wtc_path, file_name)
-            df = self.load_dataframe(file_path, 'Wage to Cereal')
-            wtc_dfs.append(df)
-
-        combined_wtc = pd.concat(wtc_dfs, ignore_index=True)
-
-        # merge dataframes
-        market_df = pd.merge(market_df, combined_wtc, on=['Region', 'District', 'Year', 'Month'], how=self.join_method)
-
-        return market_df
-    
+        fingerprint_path = f'{path}.fingerprint'
+        if not rebuild and os.path.exists(path) and os.path.exists(fingerprint_path):
+            with open(fingerprint_path) as f:
+                rebuild = f.read().strip() != self.source_fingerprint()
+        else:
+            rebuild = True
 
-    def aggregate_movements(self):
+        if rebuild:
+            df = self.write_cache(path=path)
+            return df if columns is None else df[columns]
+
+        if path.endswith('.feather'):
+            return pd.read_feather(path, columns=columns)
+        return pd.read_parquet(path, columns=columns)
+
+
+    def write_partitioned(self, output_dir='data/combined', partition_by='Region') -> pd.DataFrame:
         """
-        Combine all movement data into one DataFrame. Return the combined DataFrame.
+        Build the merged data partition by partition and write it to a Hive style Parquet dataset, e.g. 'data/combined/Region=Awdal/part-0.parquet'.
+
+        Runs in two passes. First each indicator is loaded on its own and split into one temporary file per partition. Then, for one partition at a time, those files are read back, combined as in `self.merge_data` and written out. Only one indicator or one partition is held in memory at a time.
+
+        ARGUMENTS:
+
+        `output_dir`:
+            Directory of the partitioned dataset. Existing partitions that are rebuilt are replaced, others are left untouched.
+
+        `partition_by`:
+            Key column to partition by, 'Region' or 'Year'.
+
+        RETURNS:
+            A DataFrame with the value, row count and file path of every partition written.
+        """
+
+        if partition_by not in ('Region', 'Year'):
+            raise ValueError(f"Cannot partition by '{partition_by}', expected 'Region' or 'Year'.")
+
+        indicators = get_indicators(merge=True)
+        with tempfile.TemporaryDirectory() as spill_dir:
+
+            # pass 1: split every indicator by partition
+            partitions = set()
+            for indicator in indicators:
+                indicator_df = self.aggregate_indicator(indicator)
+                for value, partition_df in indicator_df.groupby(partition_by, observed=True):
+                    partitions.add(value)
+                    partition_df.to_parquet(os.path.join(spill_dir, f'{indicator.key}--{value}.parquet'), index=False)
+                del indicator_df
+
+            # pass 2: combine and write one partition at a time
+            written = []
+            for value in sorted(partitions):
+                indicator_dfs = {}
+                for indicator in indicators:
+                    spill_path = os.path.join(spill_dir, f'{indicator.key}--{value}.parquet')
+                    if os.path.exists(spill_path):
+                        indicator_dfs[indicator] = pd.read_parquet(spill_path)
+                    else:
+                        indicator_dfs[indicator] = pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in schema([indicator]).items()})
+                unify_categories(list(indicator_dfs.values()))
+
+                df = self.combine(indicator_dfs, verbose=False)
+                df = df.drop(columns=partition_by)
+
+                partition_dir = os.path.join(output_dir, f'{partition_by}={value}')
+                if not os.path.exists(partition_dir):
+                    os.makedirs(partition_dir)
+                for old_path in glob.glob(os.path.join(partition_dir, '*.parquet')):
+                    os.remove(old_path)
+
+                partition_path = os.path.join(partition_dir, 'part-0.parquet')
+                df.to_parquet(partition_path, index=False)
+                written.append({partition_by: value, 'rows': len(df), 'path': partition_path})
+                print(f'wrote {partition_by} {value} partition')
+
+        return pd.DataFrame(written)
+
+
+    def read_partitioned(self, output_dir='data/combined', columns=None, filters=None):
         """
+        Read a dataset written by `self.write_partitioned` back into one DataFrame. Optionally only the listed `columns`, and only the rows matching pyarrow `filters`, e.g. `[('Region', 'in', ['Bay', 'Gedo'])]`.
 
-        # aggregate arrival data
-        arrivals_path = 'data/movements/arrivals'
-        arrivals_dfs = []
-        for file_name in os.listdir(arrivals_path):
-            file_path = os.path.join(arrivals_path, file_name)
-            df = self.load_dataframe(file_path, 'Arrivals')
-            arrivals_dfs.append(df)
+        The key columns get their `KEY_DTYPES` and come first, as in `self.merge_data`, whichever column the dataset is partitioned by.
+        """
+
+        df = pd.read_parquet(output_dir, columns=columns, filters=filters)
 
-        combined_arrivals = pd.concat(arrivals_dfs, ignore_index=True)
+        # the partition column is read back as a categorical of the directory names, after the other columns
+        keys = [key for key in KEYS if key in df.columns]
+        df = df[keys + [column for column in df.columns if column not in keys]]
+        return df.astype({key: KEY_DTYPES[key] for key in keys})
 
-        # aggregate departure data
-        departures_path = 'data/movements/departures'
-        departures_dfs = []
-        for file_name in os.listdir(departures_path):
-            file_path = os.path.join(departures_path, file_name)
-            df = self.load_dataframe(file_path, 'Departures')
-            departures_dfs.append(df)
 
-        combined_departures = pd.concat(departures_dfs, ignore_index=True)
+class DatasetQuery:
+    """
+    Lazy view of the merged data returned by `Aggregator.query`. The requested columns, years, regions and non-null requirement are pushed down so only the needed data is read:
+        - only the directories of the requested indicators are opened,
+        - files with no data for the requested years are skipped,
+        - rows outside the requested years and regions are dropped from each indicator before combining,
+        - if non-null values are required, indicators are combined with an inner join.
 
-        # merge dataframes
-        movements_df = pd.merge(combined_departures, combined_arrivals, on=['Region', 'District', 'Year', 'Month'], how=self.join_method)
-        return movements_df
+    `self.indicators` and `self.files` show what will be read. `self.collect` reads it and returns the DataFrame.
+    """
+
+    def __init__(self, aggregator: Aggregator, columns=None, years=None, regions=None, dropna=False) -> None:
+        merged = get_indicators(merge=True)
+        if columns is None:
+            self.indicators = merged
+        else:
+            value_names = {indicator.value_name: indicator for indicator in get_indicators()}
+            unknown = [column for column in columns if column not in value_names and column not in KEYS]
+            if unknown:
+                raise ValueError(f'Unknown columns {unknown}.')
+            self.indicators = [value_names[column] for column in columns if column in value_names]
+
+        self.aggregator = aggregator
+        self.columns = columns
+        self.years = None if years is None else sorted(set(years))
+        self.regions = None if regions is None else sorted(set(regions))
+        self.dropna = dropna
+
+
+    def files(self) -> dict:
+        """
+        Return the paths of the CSV files that `self.collect` will read, keyed by indicator value name. With a store, the path of the store.
+        """
+
+        if self.aggregator.store is not None:
+            return {indicator.value_name: [self.aggregator.store.path] for indicator in self.indicators}
+
+        return {indicator.value_name: self.aggregator.indicator_files(indicator, years=self.years) for indicator in self.indicators}
+
+
+    def collect(self):
+        """
+        Read the needed files and return the combined DataFrame with the key columns followed by the requested columns.
+        """
 
+        aggregator = self.aggregator
+        if self.dropna:
+            # rows missing from any indicator would be dropped anyway
+            aggregator = copy(aggregator)
+            aggregator.join_method = 'inner'
+
+        indicator_dfs = aggregator.aggregate_indicators(self.indicators, years=self.years)
+        for indicator, df in indicator_dfs.items():
+            if self.years is not None:
+                df = df[df['Year'].isin(self.years)]
+            if self.regions is not None:
+                df = df[df['Region'].isin(self.regions)]
+            if self.dropna:
+                df = df.dropna(subset=[indicator.value_name])
+            indicator_dfs[indicator] = df
+
+        df = aggregator.combine(indicator_dfs, verbose=False)
+
+        value_names = [indicator.value_name for indicator in self.indicators]
+        df = df[[column for column in df.columns if column in KEYS] + value_names]
+        if self.dropna:
+            df = df.dropna(subset=value_names)
+
+        return df.reset_index(drop=True)
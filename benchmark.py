@@ -0,0 +1,468 @@
+"""
+Benchmarks for the data pipeline. Run `python benchmark.py` from the repository root to print all of them.
+
+Run `python benchmark.py --suite` to time every pipeline stage (scrape, aggregate, preprocess, train) on the checked-in data and on synthetically scaled copies of it, and save the wall time, peak memory and rows per second of each stage to a JSON file (see `run_suite`).
+"""
+
+import os
+import json
+import time
+import argparse
+import contextlib
+import io
+import shutil
+import tempfile
+import threading
+import tracemalloc
+import subprocess
+from datetime import datetime
+from html import escape
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from functools import partial
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+import aggregator as ag
+import models
+from scraper import FSNAUScraper, etree
+from indicators import get_indicators
+
+
+# synthetic data sizes, as (district copies, year copies) of the checked-in data
+SCALES = {
+    '1x': (1, 1),
+    '10x': (10, 1),
+    '100x': (10, 10),
+}
+
+
+class LegacyAggregator(ag.Aggregator):
+    """
+    Aggregator that loads CSV files the way it did before numeric parsing and the declared schema moved into `load_dataframe`: indicator values stay as strings with thousands separators and key columns keep their original types. Used as a baseline.
+    """
+
+    def load_dataframe(self, df_path, value_name, dtype=None):
+        """
+        Read in and return a long format DataFrame for the CSV file passed as df_path, leaving the values unparsed. `dtype` is ignored.
+        """
+
+        df = pd.read_csv(df_path)
+        df.drop(labels=0, axis='index', inplace=True)
+        df.drop(labels='#', axis='columns', inplace=True)
+
+        df_long = pd.melt(df, id_vars=['Region', 'District'], var_name='Date', value_name=value_name)
+        df_long[['Month', 'Year']] = df_long['Date'].str.split('-', expand=True)
+        df_long.drop(labels='Date', axis='columns', inplace=True)
+
+        df_long['Year'] = pd.to_numeric(df_long['Year'])
+        df_long['Month'] = df_long['Month'].astype('category')
+        df_long['Region'] = df_long['Region'].astype('category')
+        df_long['District'] = df_long['District'].astype('category')
+
+        return df_long
+
+
+def legacy_clean(df):
+    """
+    Remove thousands separators cell by cell and force numeric, as `models.dropNA` used to. Baseline for `models.clean_numeric`.
+    """
+
+    for feature in df.columns:
+        df[feature] = df[feature].apply(lambda x: x.replace(',', '') if isinstance(x, str) else x)
+
+    numeric_cols = [feature for feature in df.columns if feature not in ('Region', 'District', 'Month', 'Year')]
+    df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric)
+    return df
+
+
+def time_call(function, repeat=3):
+    """
+    Call `function` `repeat` times. Return the fastest wall time in seconds and the result of the last call.
+    """
+
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+
+    return best, result
+
+
+def benchmark_assembly(join_method='outer', data_dir='data', repeat=3):
+    """
+    Compare chained `pd.merge` calls, single step index assembly and dense grid assembly on the indicators merged by `Aggregator.merge_data`. For merge and index assembly the files are loaded once beforehand, so only the assembly is timed and the load time is reported as its own row. Grid assembly reads the files itself, so its time includes reading them.
+
+    RETURNS:
+        A DataFrame with the wall time, rows and columns of each assembly mode.
+    """
+
+    indicators = get_indicators(merge=True)
+    load = lambda: ag.Aggregator(join_method=join_method, data_dir=data_dir).aggregate_indicators(indicators)
+    load_seconds, indicator_dfs = time_call(load, repeat=repeat)
+    dfs = [indicator_dfs[indicator] for indicator in indicators]
+
+    results = [{'assembly': 'load (merge, index)', 'seconds': load_seconds, 'rows': sum(len(df) for df in dfs), 'columns': None}]
+    for assembly in ['merge', 'index', 'grid']:
+        aggregator = ag.Aggregator(join_method=join_method, data_dir=data_dir, assembly=assembly)
+        assemble = {
+            'merge': lambda: aggregator.merge_frames(dfs),
+            'index': lambda: aggregator.assemble_frames(dfs),
+            'grid': lambda: aggregator.assemble_grid(indicators),
+        }[assembly]
+        seconds, df = time_call(assemble, repeat=repeat)
+        results.append({'assembly': assembly, 'seconds': seconds, 'rows': len(df), 'columns': len(df.columns)})
+
+    return pd.DataFrame(results)
+
+
+def benchmark_cleaning(data_dir='data', repeat=3):
+    """
+    Compare numeric cleaning of the merged data: the per-cell `apply` that `models.dropNA` used to run, vectorized `models.clean_numeric` on the same string data, and parsing numbers while reading the CSV files in `Aggregator.load_dataframe` (where `clean_numeric` only has to cast).
+
+    RETURNS:
+        A DataFrame with the wall time and rows of each cleaning method.
+    """
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        legacy_df = LegacyAggregator(data_dir=data_dir).merge_data()
+        parsed_df = ag.Aggregator(data_dir=data_dir).merge_data()
+    numeric_cols = [feature for feature in legacy_df.columns if feature not in ('Region', 'District', 'Month', 'Year')]
+
+    methods = {
+        'per-cell apply': lambda: legacy_clean(legacy_df.copy()),
+        'vectorized': lambda: models.clean_numeric(legacy_df.copy(), numeric_cols),
+        'parsed at load': lambda: models.clean_numeric(parsed_df.copy(), numeric_cols),
+    }
+
+    results = []
+    for method, clean in methods.items():
+        seconds, df = time_call(clean, repeat=repeat)
+        results.append({'method': method, 'seconds': seconds, 'rows': len(df)})
+
+    return pd.DataFrame(results)
+
+
+def benchmark_imputation(data_dir='data', engines=None, model='RF', mask_fraction=0.1, test_size=0.2, random_state=0):
+    """
+    Compare the imputation engines of `models.Preprocessor` on the merged data (index assembly): wall time, how well they recover values that were known, and how well a model trained on their output predicts the arrivals.
+
+    ARGUMENTS:
+
+    `engines`:
+        Names of the engines to compare, any of `models.IMPUTE_ENGINES`. Defaults to all of them.
+
+    `model`:
+        Model trained on every engine's output, a key of `models.MODELS`.
+
+    `mask_fraction`:
+        Fraction of the known feature values hidden before imputing, to measure the imputation error on them.
+
+    `test_size` and `random_state`:
+        Passed to `train_test_split`. The model is only scored on test rows whose arrivals were known rather than imputed.
+
+    RETURNS:
+        A DataFrame with one row per engine: the wall time of imputing the merged data, the normalized RMSE of the hidden values (RMSE divided by each feature's standard deviation, averaged over the features), and the model's R² score, RMSE and alarm level accuracy.
+    """
+
+    if engines is None:
+        engines = list(models.IMPUTE_ENGINES)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = ag.Aggregator(data_dir=data_dir, assembly='index').merge_data().reset_index(drop=True)
+    features = [column for column in models.ALL_COLUMNS if column not in models.CATEGORICAL_COLUMNS + ['Year']]
+
+    # hide a random sample of the known values
+    known = models.clean_numeric(df[features].copy(), features)
+    rng = np.random.default_rng(random_state)
+    hidden = known.notna().to_numpy() & (rng.random(known.shape) < mask_fraction)
+    masked_df = df.copy()
+    masked_df[features] = known.mask(hidden)
+    std = known.std().to_numpy(dtype='float64')
+
+    observed = df['Arrivals'].notna().to_numpy()
+    train_rows, test_rows = train_test_split(np.arange(len(df)), test_size=test_size, random_state=random_state)
+    test_rows = test_rows[observed[test_rows]]
+
+    results = []
+    for engine in engines:
+        preprocessor = models.Preprocessor('impute', top_9=True, engine=engine, random_state=random_state)
+        seconds, imputed = time_call(lambda: preprocessor.fit_transform(df), repeat=1)
+
+        masked = models.Preprocessor('impute', engine=engine, random_state=random_state).fit_transform(masked_df)[features].to_numpy(dtype='float64')
+        errors = np.where(hidden, masked - known.to_numpy(dtype='float64'), np.nan)
+        nrmse = np.nanmean(np.sqrt(np.nanmean(errors ** 2, axis=0)) / std)
+
+        X, y = imputed.drop(['Arrivals'], axis=1), imputed[['Arrivals']]
+        scores = models.evaluate_model(model, X.iloc[train_rows], y.iloc[train_rows], X.iloc[test_rows], y.iloc[test_rows])
+        results.append({
+            'engine': engine,
+            'seconds': seconds,
+            'rows': len(imputed),
+            'nrmse': nrmse,
+            'score': scores['score'],
+            'rmse': scores['rmse'],
+            'accuracy': scores['accuracy'],
+        })
+
+    return pd.DataFrame(results)
+
+
+def benchmark_memory(data_dir='data'):
+    """
+    Compare the memory used by each column of the merged data before the declared schema (string values, int64 Year, per file categories) and after it.
+
+    RETURNS:
+        The `aggregator.memory_report` of both DataFrames, in bytes per column.
+    """
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        before = LegacyAggregator(data_dir=data_dir).merge_data()
+        after = ag.Aggregator(data_dir=data_dir).merge_data()
+
+    return ag.memory_report(before=before, after=after)
+
+
+def scale_data(target_dir, districts=1, years=1, source_dir='data'):
+    """
+    Write a synthetic copy of the indicator CSV files in `source_dir` to `target_dir`, with `districts` times as many districts and `years` times as many years. Values are repeated from the checked-in data.
+
+    Extra districts are copies of every district with a number appended to the name ('Borama 2'). Extra years are copies of the whole history shifted back by its length, in both the file names and the month headers, so every file keeps its usual layout.
+    """
+
+    indicators = get_indicators(merge=True)
+    source = ag.Aggregator(data_dir=source_dir)
+    file_paths = {indicator: source.indicator_files(indicator) for indicator in indicators}
+    snapshot_years = [ag.snapshot_date(os.path.basename(path)).year for paths in file_paths.values() for path in paths]
+    span = max(snapshot_years) - min(snapshot_years) + 1
+
+    for indicator in indicators:
+        output_dir = os.path.join(target_dir, indicator.output_dir)
+        os.makedirs(output_dir, exist_ok=True)
+
+        for file_path in file_paths[indicator]:
+            df = pd.read_csv(file_path, dtype=object)
+
+            # first row is the empty row below the table header, keep it once
+            empty_row, rows = df.iloc[:1], df.iloc[1:]
+            copies = [rows]
+            for number in range(2, districts + 1):
+                copy_rows = rows.copy()
+                copy_rows['District'] = copy_rows['District'] + f' {number}'
+                copies.append(copy_rows)
+            df = pd.concat([empty_row] + copies, ignore_index=True)
+            df.loc[1:, '#'] = [str(number) for number in range(1, len(df))]
+
+            file_name = os.path.basename(file_path)
+            snapshot = ag.snapshot_date(file_name)
+            for shift in range(0, years * span, span):
+                date_columns = {column: f'{column[:4]}{int(column[4:]) - shift}' for column in df.columns if column not in ('#', 'Region', 'District')}
+                shifted_name = file_name.replace(snapshot.strftime('%d-%b-%Y'), snapshot.replace(year=snapshot.year - shift).strftime('%d-%b-%Y'))
+                df.rename(columns=date_columns).to_csv(os.path.join(output_dir, shifted_name), index=False)
+
+
+def render_fixtures(data_dir, fixtures_dir) -> list:
+    """
+    Render every indicator CSV file in `data_dir` as the HTML table of its dashboard page, saved to `fixtures_dir` under the page's URL path. Parsing a fixture gives back the CSV file.
+
+    RETURNS:
+        The URL paths of the rendered pages, e.g. 'climate/cdi/28-Jun-2015'.
+    """
+
+    aggregator = ag.Aggregator(data_dir=data_dir)
+    page_paths = []
+    for indicator in get_indicators(merge=True):
+        page_dir = os.path.join(fixtures_dir, indicator.path)
+        os.makedirs(page_dir, exist_ok=True)
+
+        for file_path in aggregator.indicator_files(indicator):
+            df = pd.read_csv(file_path, dtype=object, keep_default_na=False)
+            snapshot = ag.snapshot_date(os.path.basename(file_path))
+            page_paths.append(f"{indicator.path}/{snapshot.strftime('%d-%b-%Y')}")
+
+            header = ''.join(f'<th>{escape(column)}</th>' for column in df.columns)
+            body = ''.join('<tr>' + ''.join(f'<td>{escape(value)}</td>' for value in row) + '</tr>' for row in df.iloc[1:].itertuples(index=False))
+            with open(os.path.join(page_dir, snapshot.strftime('%d-%b-%Y')), 'w', encoding='utf-8') as f:
+                f.write(f'<html><body><table><tr>{header}</tr>{body}</table></body></html>')
+
+    return page_paths
+
+
+class _FixtureRequestHandler(SimpleHTTPRequestHandler):
+    """
+    Serve the saved fixtures as HTML pages, without logging every request.
+    """
+
+    def guess_type(self, path):
+        return 'text/html; charset=utf-8'
+
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def serve_fixtures(fixtures_dir):
+    """
+    Serve `fixtures_dir` on a free local port in a background thread. Yields the base URL to pass to `FSNAUScraper`.
+    """
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(_FixtureRequestHandler, directory=fixtures_dir))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def measure(function, trace_memory=True) -> tuple:
+    """
+    Call `function` and return its wall time in seconds, its peak memory in bytes and its result.
+
+    Tracing allocations slows Python code down considerably, so the wall time is measured on an untraced call and, if `trace_memory` is True, the peak memory on a second, traced call. Otherwise the peak memory is None.
+    """
+
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+
+    peak = None
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            function()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return seconds, peak, result
+
+
+def benchmark_pipeline(data_dir, work_dir, assembly='index', trace_memory=True):
+    """
+    Time every pipeline stage once on the CSV files in `data_dir`, using `work_dir` for scratch files.
+
+        - scrape: `FSNAUScraper.scrape_concurrent` against HTML fixtures rendered from `data_dir` and served locally, saving CSV files. Rows are the table rows parsed.
+        - aggregate: `Aggregator.merge_data` with the passed `assembly`. Rows are the rows of the merged data.
+        - preprocess (dropNA) / preprocess (impute): `models.dropNA` and `models.impute` on the merged data, keeping the top 9 features. Rows are the rows of the merged data.
+        - train (LR/DT/RF): the `models.evaluate_*` functions on an 80/20 split of the dropNA output. Rows are the training rows.
+
+    The fixture server runs in a thread of this process, so its allocations count towards the scrape stage's peak memory. See `measure` for `trace_memory`.
+
+    RETURNS:
+        A list with one dict per stage: its wall time, peak memory in MB (None without `trace_memory`), rows and rows per second.
+    """
+
+    results = []
+    def record(stage, function, rows):
+        seconds, peak, result = measure(function, trace_memory=trace_memory)
+        results.append({
+            'stage': stage,
+            'seconds': seconds,
+            'peak_memory_mb': peak / 2**20 if peak is not None else None,
+            'rows': rows(result),
+            'rows_per_second': rows(result) / seconds if seconds else None,
+        })
+        return result
+
+    fixtures_dir = os.path.join(work_dir, 'fixtures')
+    page_paths = render_fixtures(data_dir, fixtures_dir)
+    years = [int(page_path[-4:]) for page_path in page_paths]
+    categories = list(dict.fromkeys(indicator.category for indicator in get_indicators(merge=True)))
+
+    with serve_fixtures(fixtures_dir) as base_url, contextlib.redirect_stdout(io.StringIO()):
+        scraper = FSNAUScraper(min(years), max(years) + 1, base_url=base_url, parser='lxml' if etree is not None else 'html.parser', data_dir=os.path.join(work_dir, 'scraped'), validators_path=False, checkpoint_path=False, cache_dir=False)
+        urls = {f'{base_url}/{page_path}' for page_path in page_paths}
+        scrape = lambda: scraper.scrape_concurrent(categories=categories, return_dfs=True, urls=urls)
+        record('scrape', scrape, lambda result: sum(len(df) for dfs, _ in result.values() for indicator_dfs in dfs.values() for df in indicator_dfs))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = record('aggregate', ag.Aggregator(data_dir=data_dir, assembly=assembly).merge_data, len)
+        clean_df = record('preprocess (dropNA)', lambda: models.dropNA(df.copy(), top_9=True), lambda _: len(df))
+        record('preprocess (impute)', lambda: models.impute(df.copy(), top_9=True), lambda _: len(df))
+
+        train, test = train_test_split(clean_df, test_size=0.2, random_state=0)
+        X_train, y_train = train.drop(['Arrivals'], axis=1), train[['Arrivals']]
+        X_test, y_test = test.drop(['Arrivals'], axis=1), test[['Arrivals']]
+        for name, evaluate in [('LR', models.evaluate_LR), ('DT', models.evaluate_DT), ('RF', models.evaluate_RF)]:
+            record(f'train ({name})', lambda: evaluate(X_train, y_train, X_test, y_test), lambda _: len(X_train))
+
+    return results
+
+
+def git_commit():
+    """
+    Return the hash of the checked out git commit, or None outside a git repository.
+    """
+
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(scales=None, output_path='benchmark-results.json', data_dir='data', assembly='index', trace_memory=True):
+    """
+    Run `benchmark_pipeline` on the checked-in data and on synthetically scaled copies of it, and save the results to a JSON file so that runs on different commits can be compared.
+
+    ARGUMENTS:
+
+    `scales`:
+        Names of the data sizes to run, any of the keys of `SCALES`. Defaults to all of them. '1x' is the checked-in data itself, larger sizes are written to a temporary directory with `scale_data`.
+
+    `output_path`:
+        Path of the JSON file to write.
+
+    `assembly`:
+        Assembly mode of the aggregate stage. Defaults to 'index', as the row explosion of chained merges does not fit in memory at the largest sizes.
+
+    `trace_memory`:
+        Whether to run every stage a second time to measure its peak memory, see `measure`.
+
+    RETURNS:
+        A DataFrame with one row per scale and stage.
+    """
+
+    if scales is None:
+        scales = list(SCALES)
+
+    results = []
+    for scale in scales:
+        districts, years = SCALES[scale]
+        work_dir = tempfile.mkdtemp(prefix=f'benchmark-{scale}-')
+        try:
+            scale_dir = data_dir
+            if (districts, years) != (1, 1):
+                scale_dir = os.path.join(work_dir, 'data')
+                scale_data(scale_dir, districts=districts, years=years, source_dir=data_dir)
+            for result in benchmark_pipeline(scale_dir, work_dir, assembly=assembly, trace_memory=trace_memory):
+                results.append({'scale': scale, **result})
+                print(f"{scale} {result['stage']}: {result['seconds']:.2f}s, {result['rows_per_second']:.0f} rows/s")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(output_path, 'w') as f:
+        json.dump({'commit': git_commit(), 'created': datetime.now().isoformat(timespec='seconds'), 'assembly': assembly, 'results': results}, f, indent=1)
+
+    return pd.DataFrame(results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the data pipeline.')
+    parser.add_argument('--suite', action='store_true', help='time every pipeline stage on scaled data and save the results as JSON')
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=None, help='data sizes to run with --suite (default: all)')
+    parser.add_argument('--output', default='benchmark-results.json', help='JSON file to write with --suite')
+    parser.add_argument('--assembly', default='index', choices=['merge', 'index', 'grid'], help='assembly mode of the aggregate stage with --suite')
+    parser.add_argument('--no-memory', action='store_true', help='skip the traced second run of every stage with --suite')
+    args = parser.parse_args()
+
+    if args.suite:
+        print(run_suite(scales=args.scales, output_path=args.output, assembly=args.assembly, trace_memory=not args.no_memory))
+    else:
+        print(benchmark_assembly())
+        print(benchmark_cleaning())
+        print(benchmark_imputation())
+        print(benchmark_memory())
@@ -0,0 +1 @@
+# lets the tests import the repository's modules when pytest is run from any directory
@@ -0,0 +1,175 @@
+"""
+Temporal features of the district monthly panel returned by the Aggregator: lags, rolling window means and sums, and deltas of any indicator column, computed per district.
+
+Rows are sorted into one monthly series per district and every feature is a vectorized shift of the sorted columns, masked where it would reach into the previous district's series, so no Python code runs per district or per month.
+
+`FeatureBuilder.fit_transform` computes the features of a whole history and remembers the last months of every district that the features look back over. `FeatureBuilder.append` then computes the features of newly scraped months from those alone, without recomputing the history.
+"""
+
+import numpy as np
+import pandas as pd
+from aggregator import MONTHS
+
+
+# window aggregations computed by `FeatureBuilder`
+AGGREGATIONS = ('mean', 'sum')
+
+
+def month_index(df):
+    """
+    Return the number of months since year 0 of every row of `df`, from its Year and Month (a month name of `aggregator.MONTHS`) columns.
+    """
+
+    months = df['Month'].astype(object).map({month: number for number, month in enumerate(MONTHS)})
+    return df['Year'].to_numpy(dtype='int64') * 12 + months.to_numpy(dtype='int64')
+
+
+def shift(values, groups, periods):
+    """
+    Shift the rows of the 2D array `values` down by `periods` within each run of equal `groups`, filling with NaN where the shift would cross into the previous group.
+    """
+
+    shifted = np.full(values.shape, np.nan)
+    if periods == 0:
+        return values.copy()
+    if periods < len(values):
+        shifted[periods:] = values[:-periods]
+        shifted[periods:][groups[periods:] != groups[:-periods]] = np.nan
+    return shifted
+
+
+class FeatureBuilder():
+    """
+    Lag, rolling window and delta features of indicator columns, per district.
+
+    ARGUMENTS:
+
+    `columns`:
+        Indicator columns to compute features of, e.g. ['Rainfall', 'Conflict Fatalities', 'Goat Price'].
+
+    `lags`:
+        Months to lag every column by. Adds a '{column} lag {months}' column each.
+
+    `windows`:
+        Lengths in months of the rolling windows, ending at (and including) each row's month. Adds a '{column} {aggregation} {months}' column per window and aggregation in `aggregations`. Missing values are skipped; a window without any value is NaN.
+
+    `deltas`:
+        Months to difference every column over. Adds a '{column} delta {months}' column each, the value minus the value `months` earlier.
+
+    `aggregations`:
+        Window aggregations to compute, any of `AGGREGATIONS`.
+
+    Each district's rows must be consecutive months without duplicates, as in the output of the Aggregator's index or grid assembly with an outer join. A ValueError is raised otherwise, since shifting rows would then not shift months.
+    """
+
+    def __init__(self, columns, lags=(1, 2, 3), windows=(3, 6, 12), deltas=(1,), aggregations=AGGREGATIONS) -> None:
+        for aggregation in aggregations:
+            if aggregation not in AGGREGATIONS:
+                raise ValueError(f"Unknown aggregation '{aggregation}', expected one of {AGGREGATIONS}.")
+
+        self.columns = list(columns)
+        self.lags = list(lags)
+        self.windows = list(windows)
+        self.deltas = list(deltas)
+        self.aggregations = list(aggregations)
+
+        # months before a row that its features read
+        self.lookback = max(self.lags + [window - 1 for window in self.windows] + self.deltas + [0])
+        self.history = None
+
+
+    def feature_names(self) -> list:
+        """
+        Return the names of the feature columns, in the order they are added.
+        """
+
+        names = []
+        for column in self.columns:
+            names += [f'{column} lag {months}' for months in self.lags]
+            names += [f'{column} {aggregation} {months}' for months in self.windows for aggregation in self.aggregations]
+            names += [f'{column} delta {months}' for months in self.deltas]
+        return names
+
+
+    def compute(self, df):
+        """
+        Return the features of every row of `df` as a DataFrame with the index of `df`.
+        """
+
+        # one series per district, in month order
+        months = month_index(df)
+        districts = df['District'].astype(object).to_numpy()
+        order = np.lexsort((months, districts))
+        groups = pd.factorize(districts[order])[0]
+        months = months[order]
+
+        same_district = groups[1:] == groups[:-1]
+        if np.any(same_district & (np.diff(months) != 1)):
+            raise ValueError("Every district's rows must be consecutive months without duplicates.")
+
+        values = df[self.columns].to_numpy(dtype='float64', na_value=np.nan)[order]
+        lagged = {months: shift(values, groups, months) for months in range(self.lookback + 1)}
+
+        features = {}
+        for number, column in enumerate(self.columns):
+            for months in self.lags:
+                features[f'{column} lag {months}'] = lagged[months][:, number]
+            for months in self.windows:
+                window = np.stack([lagged[offset][:, number] for offset in range(months)])
+                counts = np.sum(~np.isnan(window), axis=0)
+                sums = np.where(counts > 0, np.nansum(window, axis=0), np.nan)
+                if 'mean' in self.aggregations:
+                    features[f'{column} mean {months}'] = sums / np.where(counts > 0, counts, np.nan)
+                if 'sum' in self.aggregations:
+                    features[f'{column} sum {months}'] = sums
+            for months in self.deltas:
+                features[f'{column} delta {months}'] = values[:, number] - lagged[months][:, number]
+
+        return pd.DataFrame(features, index=df.index[order])[self.feature_names()].reindex(df.index)
+
+
+    def transform(self, df):
+        """
+        Return a copy of the panel `df` with the feature columns added, recomputing every row. Does not change the remembered history.
+        """
+
+        return pd.concat([df, self.compute(df)], axis='columns')
+
+
+    def fit_transform(self, df):
+        """
+        Return a copy of the panel `df` with the feature columns added, and remember the last months of every district for `append`.
+        """
+
+        self.history = self.tail(df)
+        return self.transform(df)
+
+
+    def append(self, df):
+        """
+        Return a copy of the rows of newly arrived months `df` with the feature columns added, computed from the remembered last months of every district rather than the whole history. Then remember the new months.
+
+        The features equal those `transform` would compute over the whole history. New months must follow on from each district's remembered months.
+        """
+
+        if self.history is None:
+            raise ValueError('The FeatureBuilder has no history yet, call `fit_transform` first.')
+
+        keys = [column for column in df.columns if column in ('Region', 'District', 'Month', 'Year')]
+        new = df[keys + self.columns].reset_index(drop=True)
+        combined = pd.concat([self.history, new], ignore_index=True)
+        features = self.compute(combined).iloc[len(self.history):]
+
+        self.history = self.tail(combined)
+        return pd.concat([df, features.set_axis(df.index)], axis='columns')
+
+
+    def tail(self, df):
+        """
+        Return the key and indicator columns of the last `self.lookback` months of every district of `df`.
+        """
+
+        keys = [column for column in df.columns if column in ('Region', 'District', 'Month', 'Year')]
+        df = df[keys + self.columns].assign(month_index=month_index(df))
+        df = df.sort_values(['District', 'month_index'], kind='stable')
+        return df.groupby('District', observed=True).tail(self.lookback).drop(columns='month_index').reset_index(drop=True)
@@ -0,0 +1,80 @@
+"""
+Registry of every indicator published on the FSNAU dashboard that we scrape and aggregate.
+
+Each `Indicator` entry describes one dashboard page:
+    - `key`: name of the indicator in the dicts returned by `FSNAUScraper`.
+    - `category`: the `FSNAUScraper.scrape_*` method / `Aggregator.aggregate_*` method the indicator belongs to.
+    - `path`: URL path of the page on the dashboard, without the half year snapshot date.
+    - `output_dir`: directory inside the data directory that the half year CSV files are saved to.
+    - `value_name`: column name of the indicator in the aggregated DataFrame.
+    - `dtype`: data type of the indicator values.
+    - `start_year` / `end_year`: optional year range the indicator is published for. None means the scraper's range.
+    - `error_key`: name of the indicator in the errors dicts returned by `FSNAUScraper`. Defaults to `key`.
+    - `merge`: whether `Aggregator.merge_data` includes the indicator.
+    - `start_offset`: years after the scraper's `start_year` that the indicator's pages start. Defaults to 0.
+
+Adding an indicator is a single new entry. Entries are listed in the order the Aggregator merges them.
+"""
+
+from collections import namedtuple
+
+
+Indicator = namedtuple(
+    'Indicator',
+    ['key', 'category', 'path', 'output_dir', 'value_name', 'dtype', 'start_year', 'end_year', 'error_key', 'merge', 'start_offset'],
+    defaults=[None, None, None, True, 0]
+)
+
+
+INDICATORS = [
+    # climate
+    Indicator('cdi', 'climate', 'climate/cdi', 'climate/cdi', 'CDI', 'float32'),
+    Indicator('ndvi', 'climate', 'climate/ndvi', 'climate/ndvi', 'NDVI', 'float32'),
+    Indicator('rainfall', 'climate', 'climate/rainfall', 'climate/rainfall', 'Rainfall', 'float32'),
+    Indicator('wp', 'climate', 'climate/price-of-water', 'climate/water-price', 'Water Price', 'float32'),
+
+    # violent conflicts
+    Indicator('fatalities', 'conflicts', 'insecurity/fatalities', 'conflicts/fatalities', 'Conflict Fatalities', 'Int32', error_key='fatality'),
+    Indicator('incidents', 'conflicts', 'insecurity/incidents', 'conflicts/incidents', 'Conflict Incidents', 'Int32', error_key='incident'),
+
+    # health
+    Indicator('cholera_deaths', 'health', 'health/awd-deaths', 'health/cholera-deaths', 'Cholera Deaths', 'Int32'),
+    Indicator('cholera_cases', 'health', 'health/awd', 'health/cholera-cases', 'Cholera Cases', 'Int32'),
+    Indicator('malaria', 'health', 'health/malaria', 'health/malaria', 'Malaria', 'Int32'),
+    Indicator('measles', 'health', 'health/measles', 'health/measles', 'Measles', 'Int32'),
+
+    # malnutrition (not merged, there is no scraped malnutrition data yet). Scraped from the year after the scraper's start year, 2016 onwards with the usual 2015 start
+    Indicator('malnutrition', 'nutrition', 'nutrition/gam', 'malnutrition', 'GAM', 'float32', merge=False, start_offset=1),
+
+    # markets
+    Indicator('cmb', 'market', 'markets/cmb', 'markets/cost-min-basket', 'Cost Min Basket', 'float32'),
+    Indicator('goat', 'market', 'markets/goat', 'markets/goat', 'Goat Price', 'float32'),
+    Indicator('gtc', 'market', 'markets/tot_goat', 'markets/goat-to-cereal', 'Goat to Cereal', 'float32'),
+    Indicator('maize', 'market', 'markets/maize', 'markets/maize', 'Maize Price', 'float32'),
+    Indicator('rice', 'market', 'markets/rice', 'markets/rice', 'Rice Price', 'float32'),
+    Indicator('sorghum', 'market', 'markets/sorghum', 'markets/sorghum', 'Sorghum Price', 'float32'),
+    Indicator('wage', 'market', 'markets/wage', 'markets/wage', 'Wage Price', 'float32'),
+    Indicator('wtc', 'market', 'markets/tot_wage', 'markets/wage-to-cereal', 'Wage to Cereal', 'float32'),
+
+    # population movements
+    Indicator('departures', 'movement', 'population/departures', 'movements/departures', 'Departures', 'Int32'),
+    Indicator('arrivals', 'movement', 'population/arrivals', 'movements/arrivals', 'Arrivals', 'Int32'),
+]
+
+
+# category names in registry order
+CATEGORIES = list(dict.fromkeys(indicator.category for indicator in INDICATORS))
+
+
+def get_indicators(category=None, merge=None) -> list:
+    """
+    Return the registered indicators in registry order. Optionally only those of `category`, and only those whose `merge` flag equals `merge`.
+    """
+
+    if category is not None and category not in CATEGORIES:
+        raise ValueError(f"Unknown category '{category}', expected one of {CATEGORIES}.")
+
+    return [
+        indicator for indicator in INDICATORS
+        if (category is None or indicator.category == category) and (merge is None or indicator.merge == merge)
+    ]
@@ -0,0 +1,131 @@
+"""
+Structured timing instrumentation for the scraper and the Aggregator.
+
+Pass a `Metrics` object as the `metrics` argument of `FSNAUScraper` or `Aggregator` to record one event per unit of work:
+    - 'scrape': one per URL fetched by `FSNAUScraper.scrape`, with the fetch and parse latency, response bytes, status code and rows parsed.
+    - 'load': one per CSV file read by the Aggregator, with the load time and rows.
+    - 'merge' / 'assemble': one per merge step (or single step assembly) of the Aggregator, with the rows in and out and the time taken.
+
+Events can be streamed to a `callback` as they happen, and `Metrics.summary` / `Metrics.to_json` aggregate them per stage.
+"""
+
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+
+# fields summarized by counting their values rather than adding them up
+COUNTED_FIELDS = ('status', 'method')
+
+
+class Metrics():
+    """
+    Collect timing events from the scraper and the Aggregator.
+
+    ARGUMENTS:
+
+    `callback`:
+        Optional function called with every event dict as soon as it is recorded, e.g. `print` or a logger.
+
+    `enabled`:
+        If False nothing is recorded. The scraper and Aggregator use a disabled `Metrics` object when none is passed.
+
+    Events recorded in worker processes are not sent back; the Aggregator times its process pool loads in the workers and records them itself. A pickled copy of a `Metrics` object is disabled.
+    """
+
+    def __init__(self, callback=None, enabled=True) -> None:
+        self.callback = callback
+        self.enabled = enabled
+        self.events = []
+        self.lock = threading.Lock()
+
+
+    def __getstate__(self):
+        # copies sent to worker processes record nothing
+        return {'enabled': False}
+
+
+    def __setstate__(self, state):
+        self.__init__(enabled=state['enabled'])
+
+
+    def record(self, stage: str, **fields) -> None:
+        """
+        Record an event of `stage` with the passed fields, e.g. `seconds`, `rows` or `bytes`.
+        """
+
+        if not self.enabled:
+            return
+
+        event = {'stage': stage, **fields}
+        with self.lock:
+            self.events.append(event)
+        if self.callback is not None:
+            self.callback(event)
+
+
+    @contextmanager
+    def timer(self, stage: str, **fields):
+        """
+        Time the body of a `with` block and record it as an event of `stage` with a `seconds` field. Yields the event's fields as a dict so that the block can add to them (e.g. the rows it produced).
+        """
+
+        start = time.perf_counter()
+        yield fields
+        self.record(stage, seconds=time.perf_counter() - start, **fields)
+
+
+    def summary(self) -> dict:
+        """
+        Return the recorded events aggregated per stage: the number of events, the total, mean and maximum of every numeric field, and the number of events per value of every field in `COUNTED_FIELDS` (e.g. HTTP status codes).
+        """
+
+        with self.lock:
+            events = list(self.events)
+
+        summary = {}
+        for event in events:
+            stage = summary.setdefault(event['stage'], {'count': 0, 'fields': {}})
+            stage['count'] += 1
+            for field, value in event.items():
+                if field in COUNTED_FIELDS:
+                    counts = stage.setdefault(field, {})
+                    counts[str(value)] = counts.get(str(value), 0) + 1
+                elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                    stage['fields'].setdefault(field, []).append(value)
+
+        for stage in summary.values():
+            stage.update({
+                field: {'total': sum(values), 'mean': sum(values) / len(values), 'max': max(values)}
+                for field, values in stage.pop('fields').items()
+            })
+
+        return summary
+
+
+    def to_json(self, path=None, events=False) -> str:
+        """
+        Return the summary as a JSON string, optionally including every event. Also write it to `path` if passed.
+        """
+
+        report = {'summary': self.summary()}
+        if events:
+            with self.lock:
+                report['events'] = list(self.events)
+
+        text = json.dumps(report, indent=1)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(text)
+        return text
+
+
+def timed(function, *args) -> tuple:
+    """
+    Call `function` with `args`. Return its result and wall time in seconds, so that work done in a worker process can be timed there and recorded by the parent.
+    """
+
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
@@ -1,6 +1,9 @@
 import numpy as np
 import pandas as pd
 import math
+import time
+import pickle
+from concurrent.futures import ProcessPoolExecutor
 from sklearn.linear_model import LinearRegression
 from sklearn import tree 
 from sklearn.svm import SVC
@@ -14,90 +17,251 @@ from sklearn.impute import IterativeImputer
 from sklearn.metrics import r2_score
 from sklearn.tree import DecisionTreeRegressor
 from sklearn.ensemble import RandomForestRegressor 
+from aggregator import MONTHS, parse_numeric
 
 
-def dropNA(df, top_9=False):
+# regressors compared in the README, by short name
+MODELS = {
+    'LR': LinearRegression,
+    'DT': DecisionTreeRegressor,
+    'RF': RandomForestRegressor,
+}
+
+# FSNAU population movement alarm levels: below 1000, 1000 to 5000 and above 5000 arrivals. Linear regression predictions can be negative, so its lowest bin is open ended
+ALARM_BINS = {
+    'LR': [float('-inf'), 1000, 5000, float('inf')],
+    'DT': [0, 1000, 5000, float('inf')],
+    'RF': [0, 1000, 5000, float('inf')],
+}
+
+
+def clean_numeric(df, columns):
     """
-    Prepare the data for training, deal with NaNs. I think we also need to drop the 2014 years?
+    Convert `columns` of `df` to float32 numbers, removing thousands separators from any string values with vectorized string operations. Columns that are already numeric, as loaded by the Aggregator, are only cast.
     """
-    
-    # remove commas in numeric columns
-    for feature in df.columns:
-        df[feature] = df[feature].apply(lambda x: x.replace(',', '') if isinstance(x, str) else x)
 
-    # force numeric 
-    numeric_cols = ['Cost Min Basket', 'Goat Price', 'Goat to Cereal', 'Maize Price', 'Rice Price', 'Sorghum Price', 'Wage Price', 'Arrivals']
-    df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric)
+    for column in columns:
+        df[column] = parse_numeric(df[column], 'float32')
 
-    # make categorical columns
-    df = df.astype({"Region": 'category', "District": 'category', "Month": 'category'})
+    return df
 
-    # drop less useful columns
-    if top_9:
-        keep_cols = ['Arrivals', 'Region', 'District', 'Month', 'Year', 'Rainfall', 'Conflict Fatalities', 'Conflict Incidents', 'Water Price', 'Goat Price']
-        df = df[keep_cols]
-        df = df.dropna()
-    else:
-        columns = ['Region', 'District','CDI','Month','Year','NDVI','Rainfall','Water Price',
-            'Conflict Fatalities','Conflict Incidents','Cholera Deaths',
-            'Cholera Cases','Malaria','Measles','Cost Min Basket',
-            'Goat Price','Goat to Cereal','Maize Price','Rice Price',
-            'Sorghum Price','Wage Price','Wage to Cereal', 'Arrivals']
-        df = df[columns]
-        df = df.dropna()
-    
-    # encode data that is not numerical
-    encoder = LabelEncoder()
-    encoder.fit(df['Region'])
-    df['Region'] = encoder.transform(df['Region'])
-    encoder.fit(df['District'])
-    df['District'] = encoder.transform(df['District'])
-    encoder.fit(df['Month'])
-    df['Month'] = encoder.transform(df['Month'])
 
-    return df
+# columns kept by `dropNA` and `impute`: the nine features recommended by the UNHCR and the arrivals, or every feature but departures
+TOP_9_COLUMNS = ['Arrivals', 'Region', 'District', 'Month', 'Year', 'Rainfall', 'Conflict Fatalities', 'Conflict Incidents', 'Water Price', 'Goat Price']
+ALL_COLUMNS = ['Region', 'District','CDI','Month','Year','NDVI','Rainfall','Water Price',
+    'Conflict Fatalities','Conflict Incidents','Cholera Deaths',
+    'Cholera Cases','Malaria','Measles','Cost Min Basket',
+    'Goat Price','Goat to Cereal','Maize Price','Rice Price',
+    'Sorghum Price','Wage Price','Wage to Cereal', 'Arrivals']
+
+# columns encoded as integer labels
+CATEGORICAL_COLUMNS = ['Region', 'District', 'Month']
+
+# imputation engines of the 'impute' strategy, see `Preprocessor`
+IMPUTE_ENGINES = ('iterative', 'interpolate', 'median', 'subsample')
+
+
+class Preprocessor():
+    """
+    Fitted, reusable preparation of the merged data for training and scoring. Replaces refitting the label encoders (and imputer) on the whole history every time data is prepared.
+
+    ARGUMENTS:
 
-def impute(df, top_9=False):
+    `strategy`:
+        'dropna' drops rows with any missing value in the kept columns, as `dropNA` does. 'impute' fills missing values with an `IterativeImputer` fitted on every column, as `impute` does.
+
+    `top_9`:
+        Keep only the nine features recommended by the UNHCR and the arrivals (`TOP_9_COLUMNS`) instead of every feature (`ALL_COLUMNS`).
+
+    `engine`:
+        How 'impute' fills missing values, one of `IMPUTE_ENGINES`:
+            - 'iterative': an `IterativeImputer` fitted on every row, as `impute` always did. The slowest, its cost grows with the rows and features.
+            - 'interpolate': linear interpolation within each district's monthly series of every feature, carrying the first and last values out to the ends of the series.
+            - 'median': the median of each feature in the district.
+            - 'subsample': an `IterativeImputer` fitted on `subsample` randomly chosen rows and applied to all of them.
+        Values that 'interpolate' and 'median' cannot fill (a district without any value of a feature) get the district's fitted median, then the median over all districts.
+
+    `max_iter` and `random_state`:
+        Passed to the `IterativeImputer`. `random_state` also picks the rows of 'subsample'.
+
+    `subsample`:
+        Number of rows the 'subsample' engine fits the imputer on.
+
+    `self.fit` learns the label of every Region, District and Month (sorted, as `LabelEncoder` assigns them) and, for 'impute', fits the imputer (or the district medians). `self.transform` applies them to new rows without refitting; Regions, Districts or Months not seen while fitting get the label -1. `self.save` and `Preprocessor.load` persist the fitted object with pickle.
+    """
+
+    def __init__(self, strategy='dropna', top_9=False, engine='iterative', max_iter=10, random_state=0, subsample=2000) -> None:
+        if strategy not in ('dropna', 'impute'):
+            raise ValueError(f"Unknown strategy '{strategy}', expected 'dropna' or 'impute'.")
+        if engine not in IMPUTE_ENGINES:
+            raise ValueError(f"Unknown imputation engine '{engine}', expected one of {IMPUTE_ENGINES}.")
+
+        self.strategy = strategy
+        self.top_9 = top_9
+        self.engine = engine
+        self.max_iter = max_iter
+        self.random_state = random_state
+        self.subsample = subsample
+        self.columns = TOP_9_COLUMNS if top_9 else ALL_COLUMNS
+        self.labels = None
+        self.imputer = None
+        self.input_columns = None
+        self.features = None
+        self.medians = None
+        self.global_medians = None
+
+
+    def clean(self, df):
+        """
+        Return a copy of `df` with every non key column as float32 numbers.
+        """
+
+        df = df.copy()
+        numeric_cols = [feature for feature in df.columns if feature not in ('Region', 'District', 'Month', 'Year')]
+        return clean_numeric(df, numeric_cols)
+
+
+    def encode(self, df):
+        """
+        Replace the categorical columns of `df` with their fitted labels, in place. Return `df`.
+        """
+
+        for column in CATEGORICAL_COLUMNS:
+            df[column] = df[column].astype(object).map(self.labels[column]).fillna(-1).astype('int64')
+        return df
+
+
+    def fit(self, df):
+        """
+        Learn the labels of the categorical columns and, for 'impute', fit the imputer on the merged DataFrame `df`. Return the fitted Preprocessor.
+        """
+
+        self.fit_transform(df)
+        return self
+
+
+    def fit_transform(self, df):
+        """
+        Fit on the merged DataFrame `df` and return it prepared, in one pass. Same output as `dropNA` / `impute`.
+        """
+
+        df = self.clean(df)
+        if self.strategy == 'dropna':
+            # labels only cover the rows that are kept
+            df = df[self.columns].dropna()
+        self.labels = {column: {label: code for code, label in enumerate(np.unique(np.asarray(df[column])))} for column in CATEGORICAL_COLUMNS}
+        month_numbers = self.month_numbers(df)
+        df = self.encode(df)
+
+        if self.strategy == 'dropna':
+            return df
+
+        self.input_columns = list(df.columns)
+        if self.engine in ('iterative', 'subsample'):
+            self.imputer = IterativeImputer(max_iter=self.max_iter, random_state=self.random_state)
+            if self.engine == 'subsample' and len(df) > self.subsample:
+                self.imputer.fit(df.sample(n=self.subsample, random_state=self.random_state))
+                values = self.imputer.transform(df)
+            else:
+                values = self.imputer.fit_transform(df)
+            df = pd.DataFrame(values, columns=self.input_columns)
+        else:
+            self.features = [column for column in self.input_columns if column not in CATEGORICAL_COLUMNS + ['Year']]
+            self.medians = df.groupby('District')[self.features].median()
+            self.global_medians = df[self.features].median()
+            df = self.fill(df, month_numbers).reset_index(drop=True)
+
+        return df[self.columns]
+
+
+    def month_numbers(self, df):
+        """
+        Return the position of every row's month in the year (0 for January), to order district series before their months are encoded.
+        """
+
+        return df['Month'].astype(object).map({month: number for number, month in enumerate(MONTHS)})
+
+
+    def fill(self, df, month_numbers):
+        """
+        Fill the missing feature values of the encoded DataFrame `df` with the 'interpolate' or 'median' engine, in place. `month_numbers` orders the months of each district's series. Return `df` as float64.
+        """
+
+        if self.engine == 'interpolate':
+            # interpolate each district's series in time order, the assignment aligns the rows back on the index
+            ordered = df.assign(month_number=month_numbers).sort_values(['District', 'Year', 'month_number'], kind='stable')
+            df[self.features] = ordered.groupby('District')[self.features].transform(lambda series: series.interpolate(limit_area='inside').ffill().bfill())
+
+        # district medians, then medians over all districts
+        values = df[self.features].to_numpy(dtype='float64')
+        values = np.where(np.isnan(values), self.medians.reindex(df['District']).to_numpy(dtype='float64'), values)
+        values = np.where(np.isnan(values), self.global_medians.to_numpy(dtype='float64'), values)
+        df = df.astype('float64')
+        df[self.features] = values
+        return df
+
+
+    def transform(self, df):
+        """
+        Prepare new rows of merged data `df` with the fitted labels (and imputer) without refitting. Return the prepared DataFrame; `df` is left unchanged.
+
+        With 'dropna', rows with missing values are dropped. With 'impute', `df` needs the columns the imputer was fitted on; any that are missing are imputed. The 'interpolate' engine only interpolates between the rows passed, so pass each district's recent history along with new rows.
+        """
+
+        if self.labels is None:
+            raise ValueError('The Preprocessor is not fitted yet, call `fit` first.')
+
+        df = self.clean(df)
+        if self.strategy == 'dropna':
+            return self.encode(df[self.columns].dropna())
+
+        df = df.reindex(columns=self.input_columns)
+        month_numbers = self.month_numbers(df)
+        df = self.encode(df)
+        if self.engine in ('iterative', 'subsample'):
+            df = pd.DataFrame(self.imputer.transform(df), columns=self.input_columns, index=df.index)
+        else:
+            df = self.fill(df, month_numbers)
+        return df[self.columns]
+
+
+    def save(self, path: str) -> None:
+        """
+        Save the fitted Preprocessor to `path` with pickle.
+        """
+
+        with open(path, 'wb') as f:
+            pickle.dump(self, f)
+
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Load a Preprocessor saved with `save` from `path`.
+        """
+
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+
+def dropNA(df, top_9=False):
+    """
+    Prepare the data for training, deal with NaNs. I think we also need to drop the 2014 years?
+
+    Fits a new `Preprocessor('dropna')` on `df`; keep a fitted one to prepare new data without refitting.
+    """
+
+    return Preprocessor('dropna', top_9=top_9).fit_transform(df)
+
+
+def impute(df, top_9=False, engine='iterative'):
     """
     Prepare the data for training, impute NaNs. I think we also need to drop the 2014 years?
+
+    `engine` picks how missing values are filled, see `Preprocessor`. Fits a new `Preprocessor('impute')` on `df`; keep a fitted one to prepare new data without refitting the imputer.
     """
-    
-    # encode data that is not numerical
-    encoder = LabelEncoder()
-    encoder.fit(df['Region'])
-    df['Region'] = encoder.transform(df['Region'])
-    encoder.fit(df['District'])
-    df['District'] = encoder.transform(df['District'])
-    encoder.fit(df['Month'])
-    df['Month'] = encoder.transform(df['Month'])
-    
-    # turn string numbers into floats
-    features = ['CDI','Month','Year','NDVI','Rainfall','Water Price',
-            'Conflict Fatalities','Conflict Incidents','Cholera Deaths',
-            'Cholera Cases','Malaria','Measles','Cost Min Basket',
-            'Goat Price','Goat to Cereal','Maize Price','Rice Price',
-            'Sorghum Price','Wage Price','Wage to Cereal', 'Departures','Arrivals']
-    for feature in features:
-        df[feature] = df[feature].apply(lambda x: x.replace(',', '') if isinstance(x, str) else x)
-    
-    # actually impute
-    imp = IterativeImputer(max_iter=10, random_state=0)
-    array_imp = imp.fit_transform(df)
-    df = pd.DataFrame(array_imp, columns=df.columns) 
-
-    # drop less useful columns
-    if top_9:
-        keep_cols = ['Arrivals', 'Region', 'District', 'Month', 'Year', 'Rainfall', 'Conflict Fatalities', 'Conflict Incidents', 'Water Price', 'Goat Price']
-        df = df[keep_cols]
-    else:
-        columns = ['Region', 'District','CDI','Month','Year','NDVI','Rainfall','Water Price',
-            'Conflict Fatalities','Conflict Incidents','Cholera Deaths',
-            'Cholera Cases','Malaria','Measles','Cost Min Basket',
-            'Goat Price','Goat to Cereal','Maize Price','Rice Price',
-            'Sorghum Price','Wage Price','Wage to Cereal', 'Arrivals']
-        df = df[columns]
-        
-    return df
+
+    return Preprocessor('impute', top_9=top_9, engine=engine).fit_transform(df)
 
 
 def classification_accuracy(y_true, y_pred):
@@ -111,55 +275,117 @@ def classification_accuracy(y_true, y_pred):
     return accuracy
 
 
-def evaluate_LR(X_train, y_train, X_test, y_test):
-    LR = LinearRegression()
-    LR.fit(X_train, y_train)
-    
-    # evaluate model based on bins
-    true_bins = pd.cut(y_test['Arrivals'], bins=[float('-inf'), 1000, 5000, float('inf')], labels=[1, 2, 3], right=False)
-    preds_bin = np.digitize(LR.predict(X_test), bins=[float('-inf'), 1000, 5000, float('inf')], right=False).flatten()
-
-    score = LR.score(X_test, y_test)
-    rmse = math.sqrt(mean_squared_error(LR.predict(X_test), y_test))
-    accuracy = classification_accuracy(true_bins, preds_bin)
-    
-    print(f'score: {score}')
-    print(f'rmse: {rmse}')
-    print(f'classification accuracy: {accuracy}')
+def score_predictions(y_test, predictions, bins):
+    """
+    Score `predictions` of the arrivals in `y_test`, binning both into alarm levels with `bins` (see `ALARM_BINS`). Return a dict with the R² score, RMSE and alarm level classification accuracy.
+    """
+
+    true_bins = pd.cut(y_test['Arrivals'], bins=bins, labels=[1, 2, 3], right=False)
+    preds_bin = np.digitize(predictions, bins=bins, right=False).flatten()
+
+    return {
+        'score': r2_score(y_test, predictions),
+        'rmse': math.sqrt(mean_squared_error(predictions, y_test)),
+        'accuracy': classification_accuracy(true_bins, preds_bin),
+    }
+
+
+def evaluate_model(name, X_train, y_train, X_test, y_test):
+    """
+    Fit the model `name` (a key of `MODELS`) on the training data and predict the test data once. Return a dict with its scores (see `score_predictions`), training and test rows, and fit and predict times in seconds.
+    """
+
+    model = MODELS[name]()
+
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    predictions = model.predict(X_test)
+    predict_seconds = time.perf_counter() - start
+
+    return {
+        'model': name,
+        **score_predictions(y_test, predictions, ALARM_BINS[name]),
+        'train_rows': len(X_train),
+        'test_rows': len(X_test),
+        'fit_seconds': fit_seconds,
+        'predict_seconds': predict_seconds,
+    }
+
+
+def print_scores(scores):
+    print(f"score: {scores['score']}")
+    print(f"rmse: {scores['rmse']}")
+    print(f"classification accuracy: {scores['accuracy']}")
     print("\n")
 
 
+def evaluate_LR(X_train, y_train, X_test, y_test):
+    scores = evaluate_model('LR', X_train, y_train, X_test, y_test)
+    print_scores(scores)
+    return scores
+
+
 def evaluate_DT(X_train, y_train, X_test, y_test):
-    DT = DecisionTreeRegressor()
-    DT.fit(X_train, y_train)
-
-    # evaluate model based on bins
-    true_bins = pd.cut(y_test['Arrivals'], bins=[0, 1000, 5000, float('inf')], labels=[1, 2, 3], right=False)
-    preds_bin = np.digitize(DT.predict(X_test), bins=[0, 1000, 5000, float('inf')], right=False).flatten()
-
-    score = DT.score(X_test, y_test)
-    rmse = math.sqrt(mean_squared_error(DT.predict(X_test), y_test))
-    accuracy = classification_accuracy(true_bins, preds_bin)
-    
-    print(f'score: {score}')
-    print(f'rmse: {rmse}')
-    print(f'classification accuracy: {accuracy}')
-    print("\n")
+    scores = evaluate_model('DT', X_train, y_train, X_test, y_test)
+    print_scores(scores)
+    return scores
 
 
 def evaluate_RF(X_train, y_train, X_test, y_test):
-    RF = RandomForestRegressor()
-    RF.fit(X_train, y_train)
-
-    # evaluate model based on bins
-    true_bins = pd.cut(y_test['Arrivals'], bins=[0, 1000, 5000, float('inf')], labels=[1, 2, 3], right=False)
-    preds_bin = np.digitize(RF.predict(X_test), bins=[0, 1000, 5000, float('inf')], right=False).flatten()
-    
-    score = RF.score(X_test, y_test)
-    rmse = math.sqrt(mean_squared_error(RF.predict(X_test), y_test))
-    accuracy = classification_accuracy(true_bins, preds_bin)
-    
-    print(f'score: {score}')
-    print(f'rmse: {rmse}')
-    print(f'classification accuracy: {accuracy}')
-    print("\n")
\ No newline at end of file
+    scores = evaluate_model('RF', X_train, y_train, X_test, y_test)
+    print_scores(scores)
+    return scores
+
+
+def split_dataset(df, test_size=0.2, random_state=None):
+    """
+    Split a prepared dataset into `(X_train, y_train, X_test, y_test)`, with the arrivals as the target.
+    """
+
+    train, test = train_test_split(df, test_size=test_size, random_state=random_state)
+    return train.drop(['Arrivals'], axis=1), train[['Arrivals']], test.drop(['Arrivals'], axis=1), test[['Arrivals']]
+
+
+def _evaluate_task(dataset, name, split):
+    return {'dataset': dataset, **evaluate_model(name, *split)}
+
+
+def evaluate_grid(datasets, models=None, test_size=0.2, random_state=None, workers=None):
+    """
+    Evaluate every model on every dataset, fanning the dataset x model grid out over a process pool. Each model is fit once and predicts the test data once.
+
+    ARGUMENTS:
+
+    `datasets`:
+        Dict of prepared DataFrames (e.g. the output of `dropNA` and `impute`) keyed by dataset name. Each is split into train and test data once and every model uses the same split.
+
+    `models`:
+        Names of the models to evaluate, keys of `MODELS`. Defaults to all of them.
+
+    `test_size` and `random_state`:
+        Passed to `train_test_split`.
+
+    `workers`:
+        Number of worker processes. Defaults to the number of CPUs. With 1 the grid is evaluated in this process.
+
+    RETURNS:
+        A DataFrame with one row per dataset and model: the R² score, RMSE, alarm level accuracy, training and test rows, and fit and predict times.
+    """
+
+    if models is None:
+        models = list(MODELS)
+
+    splits = {dataset: split_dataset(df, test_size=test_size, random_state=random_state) for dataset, df in datasets.items()}
+    tasks = [(dataset, name) for dataset in datasets for name in models]
+
+    if workers == 1:
+        results = [_evaluate_task(dataset, name, splits[dataset]) for dataset, name in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_evaluate_task, dataset, name, splits[dataset]) for dataset, name in tasks]
+            results = [future.result() for future in futures]
+
+    return pd.DataFrame(results)
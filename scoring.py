@@ -0,0 +1,370 @@
+"""
+Score new district months with a fitted model, without retraining.
+
+`ArrivalsScorer.fit` fits a `models.Preprocessor` and one of `models.MODELS` on the merged data and `ArrivalsScorer.save` writes both to a single pickle file. `ArrivalsScorer.load` reads them back once; `ArrivalsScorer.predict` then scores any batch of rows (a DataFrame, or a CSV or Parquet file with `read_rows`) in one vectorized pass, returning the predicted arrivals and their alarm level.
+
+`serve` runs a scorer as a local HTTP service. Rows posted to `/predict` by concurrent requests are collected into micro-batches by a `MicroBatcher` and scored together.
+
+Run `python scoring.py train model.pkl` to fit and save a scorer on the checked-in data, `python scoring.py score model.pkl rows.csv` to score a file, and `python scoring.py serve model.pkl` to start the service.
+"""
+
+import os
+import io
+import json
+import time
+import queue
+import pickle
+import argparse
+import threading
+import contextlib
+from concurrent.futures import Future
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+import pandas as pd
+import models
+from aggregator import Aggregator
+
+
+# columns returned with every prediction to identify its row
+KEY_COLUMNS = ['Region', 'District', 'Month', 'Year']
+
+
+def read_rows(path):
+    """
+    Read rows to score from a CSV or Parquet (.parquet or .pq) file at `path`.
+    """
+
+    if os.path.splitext(path)[1].lower() in ('.parquet', '.pq'):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+class ArrivalsScorer():
+    """
+    A fitted `models.Preprocessor` and model, saved and loaded together, that predict the arrivals of new rows of merged data.
+
+    ARGUMENTS:
+
+    `name`:
+        Name of the model, a key of `models.MODELS`. Picks the alarm level bins, see `models.ALARM_BINS`.
+
+    `model`:
+        The fitted model.
+
+    `preprocessor`:
+        The `models.Preprocessor` the model's training data was prepared with.
+
+    Use `ArrivalsScorer.fit` to fit both, or `ArrivalsScorer.load` to read a saved scorer.
+    """
+
+    def __init__(self, name, model, preprocessor) -> None:
+        self.name = name
+        self.model = model
+        self.preprocessor = preprocessor
+        self.bins = models.ALARM_BINS[name]
+
+
+    @classmethod
+    def fit(cls, df, name='RF', strategy='dropna', top_9=True, engine='iterative', random_state=0):
+        """
+        Fit a `models.Preprocessor` (see its `strategy`, `top_9` and `engine` arguments) and the model `name` on all rows of the merged DataFrame `df`. Return the fitted scorer.
+        """
+
+        preprocessor = models.Preprocessor(strategy, top_9=top_9, engine=engine, random_state=random_state)
+        prepared = preprocessor.fit_transform(df)
+
+        model = models.MODELS[name]()
+        if 'random_state' in model.get_params():
+            model.set_params(random_state=random_state)
+        model.fit(prepared.drop(['Arrivals'], axis=1), prepared['Arrivals'])
+
+        return cls(name, model, preprocessor)
+
+
+    def save(self, path: str) -> None:
+        """
+        Save the scorer, model and preprocessor, to `path` with pickle.
+        """
+
+        with open(path, 'wb') as f:
+            pickle.dump(self, f)
+
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Load a scorer saved with `save` from `path`.
+        """
+
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+
+    def predict(self, df):
+        """
+        Predict the arrivals of every row of `df`, which has the columns of the merged data (any missing feature columns count as missing values; the arrivals are not needed).
+
+        RETURNS:
+            A DataFrame with the index of `df`, its key columns, the 'Predicted Arrivals' and their 'Alarm Level' (1 to 3, see `models.ALARM_BINS`). Rows the preprocessor cannot prepare, i.e. rows with missing features under the 'dropna' strategy, get no prediction.
+        """
+
+        rows = df.reset_index(drop=True)
+        columns = self.preprocessor.columns if self.preprocessor.strategy == 'dropna' else self.preprocessor.input_columns
+        rows = rows.reindex(columns=columns)
+        if self.preprocessor.strategy == 'dropna':
+            # the target is not needed to score a row, don't drop rows without it
+            rows['Arrivals'] = 0
+
+        prepared = self.preprocessor.transform(rows)
+        predictions = np.full(len(rows), np.nan)
+        if len(prepared):
+            predictions[prepared.index.to_numpy()] = np.asarray(self.model.predict(prepared.drop(['Arrivals'], axis=1)), dtype='float64').ravel()
+
+        # predictions below the lowest bin (negative arrivals) count as the lowest level
+        levels = np.clip(np.digitize(predictions, bins=self.bins, right=False), 1, len(self.bins) - 1)
+        result = df[[column for column in KEY_COLUMNS if column in df.columns]].copy()
+        result['Predicted Arrivals'] = predictions
+        result['Alarm Level'] = pd.array(np.where(np.isnan(predictions), 0, levels), dtype='Int8')
+        result.loc[np.isnan(predictions), 'Alarm Level'] = pd.NA
+        return result
+
+
+class MicroBatcher():
+    """
+    Collect the rows of concurrent scoring requests into micro-batches and score each batch with one `ArrivalsScorer.predict` call, in a background thread.
+
+    ARGUMENTS:
+
+    `scorer`:
+        The `ArrivalsScorer` to score with.
+
+    `max_rows`:
+        A batch is scored as soon as it has at least this many rows.
+
+    `max_wait`:
+        Seconds to wait for more requests after the first request of a batch arrives.
+
+    If scoring a batch raises, e.g. because one request has a value that is not a number, each of its requests is scored on its own, so only the requests that raise again fail.
+
+    Rows are prepared together with the other rows of their batch. That only matters for the preprocessor's 'interpolate' engine, which interpolates between all rows of a district passed at once.
+    """
+
+    def __init__(self, scorer, max_rows=4096, max_wait=0.005) -> None:
+        self.scorer = scorer
+        self.max_rows = max_rows
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+
+    def submit(self, df) -> Future:
+        """
+        Queue the rows of `df` to be scored. Return a Future of their `ArrivalsScorer.predict` result.
+        """
+
+        future = Future()
+        self.queue.put((df, future))
+        return future
+
+
+    def predict(self, df):
+        """
+        Score the rows of `df` in the next batch and wait for the result.
+        """
+
+        return self.submit(df).result()
+
+
+    def close(self) -> None:
+        """
+        Score the queued requests and stop the background thread.
+        """
+
+        self.queue.put(None)
+        self.thread.join()
+
+
+    def next_batch(self) -> list:
+        """
+        Wait for a request, then collect more until the batch has `max_rows` rows or `max_wait` seconds have passed. Return the (rows, future) pairs, ending with None if the batcher was closed.
+        """
+
+        batch = [self.queue.get()]
+        if batch[0] is None:
+            return batch
+
+        rows = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while rows < self.max_rows:
+            try:
+                request = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            batch.append(request)
+            if request is None:
+                break
+            rows += len(request[0])
+
+        return batch
+
+
+    def score(self, df, future) -> None:
+        """
+        Score the rows of `df` on their own and set the result, or the exception raised, on `future`.
+        """
+
+        try:
+            future.set_result(self.scorer.predict(df))
+        except Exception as e:
+            future.set_exception(e)
+
+
+    def run(self) -> None:
+        """
+        Score batches until the batcher is closed.
+        """
+
+        while True:
+            batch = self.next_batch()
+            closed = batch[-1] is None
+            requests = [request for request in batch if request is not None]
+
+            if requests:
+                try:
+                    predictions = self.scorer.predict(pd.concat([df for df, _ in requests], ignore_index=True))
+                except Exception:
+                    # score the requests one by one so only the bad ones fail
+                    for df, future in requests:
+                        self.score(df, future)
+                else:
+                    start = 0
+                    for df, future in requests:
+                        future.set_result(predictions.iloc[start:start + len(df)].set_axis(df.index))
+                        start += len(df)
+
+            if closed:
+                return
+
+
+class _ScoringRequestHandler(BaseHTTPRequestHandler):
+    """
+    `POST /predict` with a JSON list of rows (or {"rows": [...]}) or a CSV body returns the predictions as a JSON list of records, 400 if the rows cannot be read or scored, or 500 if scoring fails otherwise. `GET /health` returns the scorer's model name.
+    """
+
+    batcher = None
+
+
+    def send_json(self, status, body):
+        data = body.encode('utf-8') if isinstance(body, str) else json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+    def do_GET(self):
+        if self.path != '/health':
+            self.send_json(404, {'error': f'Unknown path {self.path}'})
+            return
+        self.send_json(200, {'status': 'ok', 'model': self.batcher.scorer.name})
+
+
+    def do_POST(self):
+        if self.path != '/predict':
+            self.send_json(404, {'error': f'Unknown path {self.path}'})
+            return
+
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            if 'csv' in self.headers.get('Content-Type', ''):
+                df = pd.read_csv(io.BytesIO(body))
+            else:
+                rows = json.loads(body)
+                df = pd.DataFrame(rows['rows'] if isinstance(rows, dict) else rows)
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_json(400, {'error': f'Could not read rows: {e}'})
+            return
+
+        try:
+            predictions = self.batcher.predict(df)
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_json(400, {'error': f'Could not score rows: {e}'})
+            return
+        except Exception as e:
+            self.send_json(500, {'error': f'Scoring failed: {e}'})
+            return
+        self.send_json(200, predictions.to_json(orient='records'))
+
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ScoringServer(ThreadingHTTPServer):
+    # dashboards open many connections at once, the default backlog of 5 resets them
+    request_queue_size = 128
+
+
+@contextlib.contextmanager
+def serve(scorer, host='127.0.0.1', port=8000, max_rows=4096, max_wait=0.005):
+    """
+    Serve `scorer` over HTTP on `host` and `port` (0 picks a free port) in a background thread, scoring requests in micro-batches (see `MicroBatcher` for `max_rows` and `max_wait`). Yields the base URL of the service.
+    """
+
+    batcher = MicroBatcher(scorer, max_rows=max_rows, max_wait=max_wait)
+    handler = type('ScoringRequestHandler', (_ScoringRequestHandler,), {'batcher': batcher})
+    server = _ScoringServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://{host}:{server.server_address[1]}'
+    finally:
+        server.shutdown()
+        server.server_close()
+        batcher.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fit, save and serve arrival forecasts.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    train = commands.add_parser('train', help='fit a scorer on the merged data and save it')
+    train.add_argument('model_path', help='pickle file to save the scorer to')
+    train.add_argument('--data-dir', default='data', help='directory of the indicator CSV files')
+    train.add_argument('--model', default='RF', choices=list(models.MODELS), help='model to fit')
+    train.add_argument('--strategy', default='dropna', choices=['dropna', 'impute'], help='how missing values are handled')
+    train.add_argument('--engine', default='iterative', choices=list(models.IMPUTE_ENGINES), help='imputation engine with --strategy impute')
+    train.add_argument('--all-features', action='store_true', help='use every feature instead of the top 9')
+
+    score = commands.add_parser('score', help='score a CSV or Parquet file of rows')
+    score.add_argument('model_path', help='pickle file of a saved scorer')
+    score.add_argument('input', help='CSV or Parquet file of rows to score')
+    score.add_argument('--output', default=None, help='CSV file to write the predictions to (default: print them)')
+
+    service = commands.add_parser('serve', help='serve a saved scorer over HTTP')
+    service.add_argument('model_path', help='pickle file of a saved scorer')
+    service.add_argument('--host', default='127.0.0.1')
+    service.add_argument('--port', type=int, default=8000)
+    service.add_argument('--max-rows', type=int, default=4096, help='rows that trigger scoring a micro-batch')
+    service.add_argument('--max-wait', type=float, default=0.005, help='seconds a micro-batch waits for more requests')
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        df = Aggregator(data_dir=args.data_dir, assembly='index').merge_data()
+        scorer = ArrivalsScorer.fit(df, name=args.model, strategy=args.strategy, top_9=not args.all_features, engine=args.engine)
+        scorer.save(args.model_path)
+    elif args.command == 'score':
+        predictions = ArrivalsScorer.load(args.model_path).predict(read_rows(args.input))
+        if args.output is None:
+            print(predictions)
+        else:
+            predictions.to_csv(args.output, index=False)
+    else:
+        with serve(ArrivalsScorer.load(args.model_path), host=args.host, port=args.port, max_rows=args.max_rows, max_wait=args.max_wait) as url:
+            print(f'serving predictions at {url}/predict')
+            try:
+                threading.Event().wait()
+            except KeyboardInterrupt:
+                pass
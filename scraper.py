@@ -1,8 +1,189 @@
 import requests
 import os
+import json
+import gzip
+import hashlib
+import threading
+import asyncio
+import time
+import random
+from io import BytesIO
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 from typing import Union
 import pandas as pd
+from indicators import Indicator, CATEGORIES, get_indicators
+from metrics import Metrics
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+
+def parse_table_html_parser(html_content: str) -> tuple:
+    """
+    Parse `html_content` into a BeautifulSoup tree with Python's built-in html.parser and return the `(headers, rows)` of its first table. Empty cells become None.
+    """
+
+    # parse HTML string and store in soup object
+    soup = BeautifulSoup(html_content, 'html.parser')
+
+    # find all table headers (to become columns)
+    data_table = soup.find_all('table')[0]
+    headers = [header.text for header in data_table.find_all('th')]
+
+    # add datatable rows (to become df rows)
+    row_list = []
+    for row in data_table.find_all('tr'):
+        row_data = []
+        for cell in row.find_all('td'):
+            text = cell.text.strip()
+            row_data.append(text if text else None)
+        row_list.append(row_data)
+
+    return headers, row_list
+
+
+def parse_table_lxml(html_content: str) -> tuple:
+    """
+    Stream `html_content` through lxml's HTML parser and return the `(headers, rows)` of its first table, stopping as soon as that table is closed. Empty cells become None.
+
+    Produces the same output as `parse_table_html_parser` without building a tree of the whole page, for well formed tables such as the dashboard's. The two differ on malformed markup: lxml closes `<td>` and `<tr>` tags that are left open as browsers do, while html.parser nests the following cells inside them.
+    """
+
+    if etree is None:
+        raise ImportError("The 'lxml' parser requires the lxml package to be installed.")
+
+    data_table = None
+    for event, element in etree.iterparse(BytesIO(html_content.encode('utf-8')), events=('start', 'end'), html=True, encoding='utf-8'):
+        if event == 'start' and data_table is None and element.tag == 'table':
+            data_table = element
+        elif event == 'end' and element is data_table:
+            break
+    else:
+        if data_table is None:
+            raise IndexError('No table found in page.')
+
+    headers = [''.join(header.itertext()) for header in data_table.iter('th')]
+
+    row_list = []
+    for row in data_table.iter('tr'):
+        row_data = []
+        for cell in row.iter('td'):
+            text = ''.join(cell.itertext()).strip()
+            row_data.append(text if text else None)
+        row_list.append(row_data)
+
+    return headers, row_list
+
+
+# table extraction backends selectable with the `parser` argument of `FSNAUScraper`
+PARSERS = {
+    'html.parser': parse_table_html_parser,
+    'lxml': parse_table_lxml,
+}
+
+
+class _HostRateLimiter():
+    """
+    Space out request start times so that no single host receives more than `requests_per_second` requests per second. No limit if `requests_per_second` is None.
+    """
+
+    def __init__(self, requests_per_second=None) -> None:
+        self.interval = 1 / requests_per_second if requests_per_second else 0
+        self.next_slot = {}
+
+
+    async def wait(self, url: str) -> None:
+        """
+        Sleep until the host of `url` may receive another request, and reserve the following slot.
+        """
+
+        if not self.interval:
+            return
+
+        host = urlsplit(url).netloc
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self.next_slot.get(host, now))
+        self.next_slot[host] = slot + self.interval
+        await asyncio.sleep(slot - now)
+
+
+# response status codes worth retrying: rate limiting and server side failures
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of sending a request to a host whose circuit breaker is open.
+    """
+
+
+def transient_error(error: Exception) -> bool:
+    """
+    Return whether `error` may go away if the request is sent again later: connection errors, timeouts, retryable statuses and open circuits. Missing pages and pages without a table are not.
+    """
+
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code in RETRY_STATUSES
+    return isinstance(error, (CircuitOpenError, requests.ConnectionError, requests.Timeout))
+
+
+def write_json(path: str, data) -> None:
+    """
+    Write `data` to the JSON file at `path`, through a temporary file so an interrupted run never leaves a truncated file.
+    """
+
+    json_dir = os.path.dirname(path)
+    if json_dir and not os.path.exists(json_dir):
+        os.makedirs(json_dir)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+class _CircuitBreaker():
+    """
+    Stop sending requests to a host after `threshold` consecutive failed attempts, for `cooldown` seconds. After the cooldown requests are let through again; one more failure reopens the circuit and a success closes it.
+    """
+
+    def __init__(self, threshold=5, cooldown=60.0) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = {}
+        self.open_until = {}
+        self.lock = threading.Lock()
+
+
+    def check(self, url: str) -> None:
+        """
+        Raise `CircuitOpenError` if the circuit of the host of `url` is open.
+        """
+
+        host = urlsplit(url).netloc
+        with self.lock:
+            remaining = self.open_until.get(host, 0) - time.monotonic()
+        if remaining > 0:
+            raise CircuitOpenError(f'Circuit open for {host} after {self.threshold} consecutive failures, retry in {remaining:.1f}s.')
+
+
+    def success(self, url: str) -> None:
+        with self.lock:
+            self.failures[urlsplit(url).netloc] = 0
+
+
+    def failure(self, url: str) -> None:
+        host = urlsplit(url).netloc
+        with self.lock:
+            self.failures[host] = self.failures.get(host, 0) + 1
+            if self.failures[host] >= self.threshold:
+                self.open_until[host] = time.monotonic() + self.cooldown
 
 
 class FSNAUScraper():
@@ -13,6 +194,17 @@ class FSNAUScraper():
         - `start_year`: the year to start scraping data from.
         - `end_year`: the year to stop scraping data from.
         - initialized with base URL to scrape data from. Defaults to FSNAU Dashboard URL.
+        - `pool_size`: number of keep-alive connections kept open per host by the scraper's HTTP session. `self.crawl` raises it to its `max_in_flight` if that is larger.
+        - `parser`: table extraction backend, one of `PARSERS`. 'html.parser' (default) builds a full BeautifulSoup tree, 'lxml' streams the page and stops at the end of the first table.
+        - `data_dir`: directory the scraped CSV files are saved under. Defaults to 'data'.
+        - `validators_path`: JSON file storing the ETag/Last-Modified headers of every saved page, used to send conditional requests. Defaults to 'http-validators.json' in `data_dir`. Set to False to always download pages in full.
+        - `metrics`: optional `metrics.Metrics` object that records the fetch and parse latency, response bytes, status and rows of every URL scraped.
+        - `max_retries`, `backoff` and `max_backoff`: failed requests (connection errors, timeouts and 429/5xx responses) are retried up to `max_retries` times, waiting a random time of up to `backoff` * 2^attempt seconds, capped at `max_backoff`, in between. A numeric Retry-After header is used instead if the server sends one.
+        - `breaker_threshold` and `breaker_cooldown`: after `breaker_threshold` consecutive failed attempts against a host, no requests are sent to it for `breaker_cooldown` seconds; they fail with `CircuitOpenError` instead.
+        - `timeout`: seconds to wait for the server before a request counts as failed.
+        - `cache_dir`: directory of the raw HTML cache. Every page downloaded is stored there gzip compressed under its SHA-256 content hash, with an `index.json` mapping each URL to its latest hash. Identical pages are stored once. Defaults to 'html-cache' in `data_dir`. Set to False to disable.
+        - `store`: optional `store.SQLiteStore`. Every page scraped is also written into it as long format rows, upserted on (indicator, district, year, month). Independent of `to_csv`. Pages that are not downloaded again (unchanged or resumed) are written from their saved CSV files. Pages must be scraped with the `output_dir` of a registered indicator.
+        - `checkpoint_path`: JSON file listing the URLs saved to CSV files so far by `self.scrape_category` (and the `scrape_*` methods) or `self.crawl`. A scrape that is interrupted or ends with transient errors (see `transient_error`) can be run again and only fetches the pages that are not listed; the others are read back from their CSV files. The listed URLs are removed once a category (or crawl) completes without transient errors. Defaults to 'scrape-checkpoint.json' in `data_dir`. Set to False to disable.
     
     Scrape single URL:
         - `self.scrape` method scrapes data from single URL passed as argument.
@@ -29,388 +221,415 @@ class FSNAUScraper():
         - `self.scrape_health` method scrapes data from all health pages from `self.start_year` to `self.end_year`. Optionally saves and returns the DataFrames.
 
         - `self.scrape_conflicts` method scrapes data from all violent conflict pages from `self.start_year` to `self.end_year`. Optionally saves and returns the DataFrames.
+
+        - `self.scrape_category` method scrapes every indicator of a category registered in `indicators.INDICATORS`. The methods above are shortcuts for it.
+
+    Scrape Data Concurrently:
+        - `self.crawl` coroutine queues the pages of several categories at once and fetches them concurrently, with a limit on requests in flight and an optional per-host rate limit. Returns the same DataFrames and errors as the `scrape_*` methods.
+
+        - `self.scrape_concurrent` method runs `self.crawl` from synchronous code.
+
+    Scrape Data Incrementally:
+        - `self.manifest` method lists every expected half year page with the status of its saved CSV file: 'missing', 'stale' or 'current'.
+
+        - `self.scrape_incremental` method scrapes only the missing and stale pages.
+
+    Rebuild Data Offline:
+        - `self.rebuild_from_cache` method parses every page in the raw HTML cache again and rewrites its CSV file, without any network access.
           
     """
 
 
-    def __init__(self, start_year: int, end_year: int, base_url='https://dashboard.fsnau.org') -> None:
+    def __init__(self, start_year: int, end_year: int, base_url='https://dashboard.fsnau.org', parser='html.parser', data_dir='data', pool_size=10, validators_path=None, metrics=None, max_retries=3, backoff=1.0, max_backoff=30.0, breaker_threshold=5, breaker_cooldown=60.0, timeout=30, checkpoint_path=None, cache_dir=None, store=None) -> None:
+        if parser not in PARSERS:
+            raise ValueError(f"Unknown parser '{parser}', expected one of {list(PARSERS)}.")
+
         self.base_url = base_url
+        self.parser = parser
         self.start_year = start_year
         self.end_year = end_year
+        self.data_dir = data_dir
+        self.metrics = metrics if metrics is not None else Metrics(enabled=False)
+
+        # one pooled keep-alive session shared by every request
+        self.session = requests.Session()
+        self.mount_adapter(pool_size)
+
+        # ETag/Last-Modified headers of previously saved pages, keyed by URL
+        validators_path = self.state_path(validators_path, 'http-validators.json')
+        self.validators_path = validators_path
+        self.validators = {}
+        self.validators_lock = threading.Lock()
+        if validators_path is not None and os.path.exists(validators_path):
+            with open(validators_path) as f:
+                self.validators = json.load(f)
+
+        # retries, backoff and per-host circuit breaking of failed requests
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.breaker = _CircuitBreaker(breaker_threshold, breaker_cooldown)
+
+        # consolidated long format store written alongside (or instead of) the CSV files
+        self.store = store
+
+        # raw HTML of every downloaded page, content addressed, and the latest hash of every URL
+        cache_dir = self.state_path(cache_dir, 'html-cache')
+        self.cache_dir = cache_dir
+        self.cache_index = {}
+        self.cache_lock = threading.Lock()
+        if cache_dir is not None and os.path.exists(os.path.join(cache_dir, 'index.json')):
+            with open(os.path.join(cache_dir, 'index.json')) as f:
+                self.cache_index = json.load(f)
+
+        # URLs already saved by an interrupted or partly failed scrape
+        checkpoint_path = self.state_path(checkpoint_path, 'scrape-checkpoint.json')
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint = set()
+        self.checkpoint_lock = threading.Lock()
+        if checkpoint_path is not None and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as f:
+                self.checkpoint = set(json.load(f))
+
+
+    def state_path(self, path, name: str):
+        """
+        Return where scraper state passed as `path` is kept: `name` inside `self.data_dir` if `path` is None, None (disabled) if it is False, otherwise `path` itself.
+        """
+
+        if path is False:
+            return None
+        if path is None:
+            return os.path.join(self.data_dir, name)
+        return path
 
 
-    def scrape(self, url: str, to_csv=True, output_dir=None) -> Union[str, dict]:
+    def mount_adapter(self, pool_size: int) -> None:
+        """
+        Mount an HTTP adapter keeping up to `pool_size` keep-alive connections open per host on the session.
         """
-        Scrape data from the passed URL and return it as a DataFrame. Optionally save to a CSV file.
 
-        ARGUMENTS:
+        self.pool_size = pool_size
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
 
-        `url`:
-            A single URL to scrape data from.
 
-        `to_csv`:
-            A flag indicating whether to save the DataFrame to a CSV file.
-            
-            If `to_csv` is set to True, saves scraped data to a CSV file in 'data/output_dr' directory. The filename is the part of the URL after '.org'. For example, 'https://dashboard.fsnau.org/population/arrivals' will save to data/population-arrivals.csv.
+    def csv_path(self, url: str, output_dir: str) -> str:
+        """
+        Return the path of the CSV file that the page at `url` is saved to: the part of the URL after the base URL, with '/' replaced by '-', inside `output_dir`.
+        """
 
-        `output_dir`:
-            Directory to save the data to. If passed, subdirectory in 'data' is made, otherwise defaults to 'data' directory.
+        if url.startswith(self.base_url):
+            file_name = url[len(self.base_url):].strip('/')
+        else:
+            file_name = url.split('.org/')[-1]
+        file_name = file_name.replace('/', '-')
+        return os.path.join(self.data_dir, output_dir or '', f'{file_name}.csv')
 
-        RETURNS:
-            A DataFrame with the scraped data. If the URL request fails, exits and returns the error.
-        
+
+    def conditional_headers(self, url: str) -> dict:
+        """
+        Return the If-None-Match/If-Modified-Since request headers for `url` from its stored validators. Empty if none are stored.
         """
 
-        try:
+        validators = self.validators.get(url, {})
+        headers = {}
+        if 'etag' in validators:
+            headers['If-None-Match'] = validators['etag']
+        if 'last_modified' in validators:
+            headers['If-Modified-Since'] = validators['last_modified']
+        return headers
 
-            # submit URL request and store returned contents as string
-            response = requests.get(url)
-            html_content = response.text
 
-            # parse HTML string and store in soup object
-            soup = BeautifulSoup(html_content, 'html.parser')
+    def store_validators(self, url: str, response: requests.Response) -> None:
+        """
+        Save the ETag/Last-Modified headers of `response` for `url` to `self.validators_path`.
+        """
 
-            # find all table headers (to become columns)
-            data_table = soup.find_all('table')[0]
-            headers = [header.text for header in data_table.find_all('th')]
-            
-            # add datatable rows (to become df rows)
-            rows = [row for row in data_table.find_all('tr')]
-            row_list = []
-            for row in rows:
-                row_data = [cell.text.strip() if cell.text.strip() else None for cell in row.find_all('td')]
-                row_list.append(row_data)
-                
-            # create dataframe
-            df = pd.DataFrame(row_list, columns=headers)
-
-            # make output data directory if it doesnt already exist
-            output_dir = os.path.join('data', output_dir)
-            if not os.path.exists(output_dir):
-                os.makedirs(output_dir)
-
-            # get filepath from URL
-            file_name = url.split('.org/')[-1]
-            file_name = file_name.replace('/', '-')
-            file_path = os.path.join(output_dir, file_name)
+        if self.validators_path is None:
+            return
 
-            # save dataframe if `to_csv` is True
-            if to_csv:
-                df.to_csv(f'{file_path}.csv', index=False)
+        validators = {}
+        if 'ETag' in response.headers:
+            validators['etag'] = response.headers['ETag']
+        if 'Last-Modified' in response.headers:
+            validators['last_modified'] = response.headers['Last-Modified']
 
-            return df
+        with self.validators_lock:
+            if validators:
+                self.validators[url] = validators
+            else:
+                self.validators.pop(url, None)
 
-        # check for any error
-        except Exception as e:
-            raise e
-        
+            write_json(self.validators_path, self.validators)
 
-    def scrape_movement(self, to_csv=True, return_dfs=False):
+
+    def cache_object_path(self, digest: str) -> str:
+        """
+        Return the path of the cached page with SHA-256 hash `digest`.
         """
-        Scrape data for population movements (arrivals and departures) for all available years. Optionally save to a CSV file and return the DataFrame.
 
-        ARGUMENTS:
+        return os.path.join(self.cache_dir, 'objects', digest[:2], f'{digest}.html.gz')
 
-        `to_csv`:
-            A flag indicating whether to save the DataFrame to a CSV file.
-            
-            If `to_csv` is set to True, saves scraped data to a CSV file in 'data/climate/output_dir' directory. The filename is the part of the URL after '.org'. For example, 'https://dashboard.fsnau.org/population/arrivals' will save to data/population-arrivals.csv.
 
-        `return_dfs`:
-            If `True` returns the DataFrame as well.
+    def cache_page(self, url: str, output_dir: str, response: requests.Response) -> None:
+        """
+        Store the raw body of `response` in the HTML cache, unless a page with the same content is stored already, and point `url` at it in the cache index.
+        """
 
-        `return_errors`:
-            If `True` returns the errors if any.
+        if self.cache_dir is None:
+            return
+
+        digest = hashlib.sha256(response.content).hexdigest()
+        object_path = self.cache_object_path(digest)
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            tmp_path = f'{object_path}.{threading.get_ident()}.tmp'
+            with gzip.open(tmp_path, 'wb') as f:
+                f.write(response.content)
+            os.replace(tmp_path, object_path)
+
+        with self.cache_lock:
+            self.cache_index[url] = {
+                'sha256': digest,
+                'output_dir': output_dir,
+                'encoding': response.encoding or 'utf-8',
+                'fetched': datetime.now().isoformat(timespec='seconds'),
+            }
+            write_json(os.path.join(self.cache_dir, 'index.json'), self.cache_index)
 
-        RETURNS:
-            Optionally a DataFrame with the scraped data. Always return any error codes from failed scrape attempts.
-        
+
+    def cached_html(self, url: str) -> str:
+        """
+        Return the cached HTML of the page at `url`. Raises KeyError if it is not cached.
         """
 
-        # base climate data URL
-        movement_url = f'{self.base_url}/population'
+        entry = self.cache_index[url]
+        with gzip.open(self.cache_object_path(entry['sha256']), 'rb') as f:
+            return f.read().decode(entry['encoding'], errors='replace')
 
-        # scrape population arrivals data
-        arrival_dfs = []
-        arrival_errors = []
-        for year in range(self.start_year, self.end_year, 1):
 
-            # try to scrape first half of year
-            first_half = f'{movement_url}/arrivals/28-Jun-{year}'
-            try:
-                arrival_dfs.append(self.scrape(first_half, to_csv=to_csv, output_dir='movements/arrivals'))
-            except Exception as e:
-                arrival_errors.append(e)
-            
-            # try to scrape second half of year
-            second_half = f'{movement_url}/arrivals/28-Dec-{year}'
-            try:
-                arrival_dfs.append(self.scrape(second_half, to_csv=to_csv, output_dir='movements/arrivals'))
-            except Exception as e:
-                arrival_errors.append(e)
+    def parse_page(self, html_content: str) -> pd.DataFrame:
+        """
+        Extract the first table of `html_content` with the selected parser backend and return it as a DataFrame.
+        """
 
-        print(f"Scraped population arrival data with {len(arrival_errors)} errors.")
+        headers, row_list = PARSERS[self.parser](html_content)
+        return pd.DataFrame(row_list, columns=headers)
 
-        # scrape population departures data
-        departure_dfs = []
-        departure_errors = []
-        for year in range(self.start_year, self.end_year, 1):
 
-            # try to scrape first half of year
-            first_half = f'{movement_url}/departures/28-Jun-{year}'
-            try:
-                departure_dfs.append(self.scrape(first_half, to_csv=to_csv, output_dir='movements/departures'))
-            except Exception as e:
-                departure_errors.append(e)
-            
-            # try to scrape second half of year
-            second_half = f'{movement_url}/departures/28-Dec-{year}'
-            try:
-                departure_dfs.append(self.scrape(second_half, to_csv=to_csv, output_dir='movements/departures'))
-            except Exception as e:
-                departure_errors.append(e)
+    def store_page(self, url: str, output_dir: str, df: pd.DataFrame) -> None:
+        """
+        Write the scraped page `df` from `url` into `self.store`, as rows of the registered indicator saved to `output_dir`, from the snapshot date at the end of the URL.
+        """
 
-        print(f"Scraped population departure data with {len(departure_errors)} errors.")
+        indicator = next((indicator for indicator in get_indicators() if indicator.output_dir == output_dir), None)
+        if indicator is None:
+            raise ValueError(f"No registered indicator is saved to '{output_dir}', pass the `output_dir` of an indicator in `indicators.INDICATORS` to write the page into the store.")
+        snapshot = datetime.strptime(url.rsplit('/', 1)[-1], '%d-%b-%Y')
+        self.store.upsert_page(indicator, df, snapshot)
 
-        errors = {
-            'arrivals': arrival_errors,
-            'departures': departure_errors
-        }
-        
-        if return_dfs:
-            dfs = {
-                'arrivals': arrival_dfs,
-                'departures': departure_dfs
-            }
-            return dfs, errors
-        else:
-            return errors
 
+    def read_saved_page(self, url: str, output_dir: str, csv_path: str) -> pd.DataFrame:
+        """
+        Return the page from `url` saved at `csv_path`, for pages that are not downloaded again. The page is also written into `self.store` if there is one, so that unchanged pages reach it too.
+        """
 
-    def scrape_market(self, to_csv=True, return_dfs=False):
+        df = pd.read_csv(csv_path, dtype=object)
+        if self.store is not None:
+            self.store_page(url, output_dir, df)
+        return df
+
+
+    def update_checkpoint(self, add=(), remove=()) -> None:
+        """
+        Add the URLs in `add` to the checkpoint and remove those in `remove`, saving it to `self.checkpoint_path`. The file is deleted once the checkpoint is empty.
         """
-        Scrape data for market prices (maize, sorghum, rice, goat, wage,) for 2015 onwards. Optionally save to a CSV file and return the DataFrame.
 
-        ARGUMENTS:
+        if self.checkpoint_path is None:
+            return
 
-        `to_csv`:
-            A flag indicating whether to save the DataFrame to a CSV file.
-            
-            If `to_csv` is set to True, saves scraped data to a CSV file in 'data/climate/output_dir' directory. The filename is the part of the URL after '.org'. For example, 'https://dashboard.fsnau.org/population/arrivals' will save to data/population-arrivals.csv.
+        with self.checkpoint_lock:
+            self.checkpoint.update(add)
+            self.checkpoint.difference_update(remove)
+            if self.checkpoint:
+                write_json(self.checkpoint_path, sorted(self.checkpoint))
+            elif os.path.exists(self.checkpoint_path):
+                os.remove(self.checkpoint_path)
 
-        `return_dfs`:
-            If `True` returns the DataFrame as well.
 
-        `return_errors`:
-            If `True` returns the errors if any.
+    def fetch(self, url: str, headers=None) -> requests.Response:
+        """
+        Send a GET request for `url`, retrying connection errors, timeouts and retryable statuses (see `RETRY_STATUSES`) with exponential backoff and jitter. Return the response.
 
-        RETURNS:
-            Optionally a DataFrame with the scraped data. Always return any error codes from failed scrape attempts.
-        
+        Raises the last error once the retries are used up, `requests.HTTPError` straight away for other error statuses, and `CircuitOpenError` if the host's circuit breaker is open.
         """
-        
-        # base climate data URL
-        market_url = f'{self.base_url}/markets'
 
-        # scrape maize price data
-        maize_dfs = []
-        maize_errors = []
-        for year in range(self.start_year, self.end_year, 1):
+        for attempt in range(self.max_retries + 1):
+            self.breaker.check(url)
 
-            # try to scrape first half of year
-            first_half = f'{market_url}/maize/28-Jun-{year}'
+            retry_after = None
             try:
-                maize_dfs.append(self.scrape(first_half, to_csv=to_csv, output_dir='markets/maize'))
-            except Exception as e:
-                maize_errors.append(e)
-            
-            # try to scrape second half of year
-            second_half = f'{market_url}/maize/28-Dec-{year}'
-            try:
-                maize_dfs.append(self.scrape(second_half, to_csv=to_csv, output_dir='markets/maize'))
-            except Exception as e:
-                maize_errors.append(e)
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUSES:
+                    # the host is up even if the page is missing
+                    self.breaker.success(url)
+                    response.raise_for_status()
+                    return response
+                error = requests.HTTPError(f'{response.status_code} Server Error for url: {url}', response=response)
+                if response.headers.get('Retry-After', '').isdigit():
+                    retry_after = int(response.headers['Retry-After'])
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
 
-        print(f"Scraped maize price data with {len(maize_errors)} errors.")
+            self.breaker.failure(url)
+            if attempt == self.max_retries:
+                raise error
 
-        # scrape sorghum price data
-        sorghum_dfs = []
-        sorgum_errors = []
-        for year in range(self.start_year, self.end_year, 1):
+            # full jitter: a random wait up to the exponential backoff
+            delay = retry_after if retry_after is not None else random.uniform(0, self.backoff * 2 ** attempt)
+            time.sleep(min(delay, self.max_backoff))
 
-            # try to scrape first half of year
-            first_half = f'{market_url}/sorghum/28-Jun-{year}'
-            try:
-                sorghum_dfs.append(self.scrape(first_half, to_csv=to_csv, output_dir='markets/sorghum'))
-            except Exception as e:
-                sorgum_errors.append(e)
-            
-            # try to scrape second half of year
-            second_half = f'{market_url}/sorghum/28-Dec-{year}'
-            try:
-                sorghum_dfs.append(self.scrape(second_half, to_csv=to_csv, output_dir='markets/sorghum'))
-            except Exception as e:
-                sorgum_errors.append(e)
 
-        print(f"Scraped sorghum price data with {len(sorgum_errors)} errors.")
+    def scrape(self, url: str, to_csv=True, output_dir=None, resume=False) -> Union[str, dict]:
+        """
+        Scrape data from the passed URL and return it as a DataFrame. Optionally save to a CSV file.
 
-        # scrape rice price data
-        rice_dfs = []
-        rice_errors = []
-        for year in range(self.start_year, self.end_year, 1):
+        ARGUMENTS:
 
-            # try to scrape first half of year
-            first_half = f'{market_url}/rice/28-Jun-{year}'
-            try:
-                rice_dfs.append(self.scrape(first_half, to_csv=to_csv, output_dir='markets/rice'))
-            except Exception as e:
-                rice_errors.append(e)
+        `url`:
+            A single URL to scrape data from.
+
+        `to_csv`:
+            A flag indicating whether to save the DataFrame to a CSV file.
             
-            # try to scrape second half of year
-            second_half = f'{market_url}/rice/28-Dec-{year}'
-            try:
-                rice_dfs.append(self.scrape(second_half, to_csv=to_csv, output_dir='markets/rice'))
-            except Exception as e:
-                rice_errors.append(e)
+            If `to_csv` is set to True, saves scraped data to a CSV file in 'data/output_dr' directory. The filename is the part of the URL after '.org'. For example, 'https://dashboard.fsnau.org/population/arrivals' will save to data/population-arrivals.csv.
 
-        print(f"Scraped rice price data with {len(rice_errors)} errors.")
+        `output_dir`:
+            Directory to save the data to. If passed, subdirectory in 'data' is made, otherwise defaults to 'data' directory.
 
-        # scrape goat price data
-        goat_dfs = []
-        goat_errors = []
-        for year in range(self.start_year, self.end_year, 1):
+        `resume`:
+            Set by `self.scrape_category` and `self.crawl`. The saved page is recorded in the checkpoint, and a page the checkpoint already lists is read back from its CSV file without a request. A plain `self.scrape` call neither reads nor adds to the checkpoint.
 
-            # try to scrape first half of year
-            first_half = f'{market_url}/goat/28-Jun-{year}'
-            try:
-                goat_dfs.append(self.scrape(first_half, to_csv=to_csv, output_dir='markets/goat'))
-            except Exception as e:
-                goat_errors.append(e)
-            
-            # try to scrape second half of year
-            second_half = f'{market_url}/goat/28-Dec-{year}'
-            try:
-                goat_dfs.append(self.scrape(second_half, to_csv=to_csv, output_dir='markets/goat'))
-            except Exception as e:
-                goat_errors.append(e)
+        RETURNS:
+            A DataFrame with the scraped data. If the URL request fails, exits and returns the error.
 
-        print(f"Scraped goat price data with {len(goat_errors)} errors.")
+            If the page was saved before and the server reports it unchanged (304 Not Modified), the saved CSV file is returned instead of downloading and parsing the page again. If only the raw HTML cache still has the page, the cached copy is parsed instead. With `resume`, the same goes for pages listed in the checkpoint of an earlier, unfinished scrape.
 
-        # scrape wage price data
-        wage_dfs = []
-        wage_errors = []
-        for year in range(self.start_year, self.end_year, 1):
+            Failed requests are retried (see `self.fetch`); the last error is raised if they all fail.
+        
+        """
 
-            # try to scrape first half of year
-            first_half = f'{market_url}/wage/28-Jun-{year}'
-            try:
-                wage_dfs.append(self.scrape(first_half, to_csv=to_csv, output_dir='markets/wage'))
-            except Exception as e:
-                wage_errors.append(e)
-            
-            # try to scrape second half of year
-            second_half = f'{market_url}/wage/28-Dec-{year}'
-            try:
-                wage_dfs.append(self.scrape(second_half, to_csv=to_csv, output_dir='markets/wage'))
-            except Exception as e:
-                wage_errors.append(e)
+        # make output data directory if it doesnt already exist, concurrent crawl workers may race to create it
+        csv_path = self.csv_path(url, output_dir)
+        if to_csv:
+            os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+
+        # resume: pages saved by an earlier unfinished scrape are not fetched again
+        if resume and to_csv and url in self.checkpoint and os.path.exists(csv_path):
+            return self.read_saved_page(url, output_dir, csv_path)
+
+        # only ask for changes if we still have a saved copy (CSV file or cached HTML) to fall back on
+        saved_csv = to_csv and os.path.exists(csv_path)
+        request_headers = {}
+        if saved_csv or url in self.cache_index:
+            request_headers = self.conditional_headers(url)
+
+        # submit URL request and store returned contents as string
+        start = time.perf_counter()
+        response = self.fetch(url, headers=request_headers)
+        fetch_seconds = time.perf_counter() - start
+        if response.status_code == 304 and saved_csv:
+            # mark the saved copy as checked so it is no longer considered stale
+            os.utime(csv_path)
+            self.metrics.record('scrape', url=url, status=304, bytes=0, fetch_seconds=fetch_seconds, parse_seconds=0.0, rows=None)
+            if resume:
+                self.update_checkpoint(add=[url])
+            return self.read_saved_page(url, output_dir, csv_path)
+        if response.status_code == 304:
+            html_content = self.cached_html(url)
+        else:
+            html_content = response.text
+            self.cache_page(url, output_dir, response)
+
+        # extract the first table's headers and rows with the selected backend
+        start = time.perf_counter()
+        df = self.parse_page(html_content)
+        parse_seconds = time.perf_counter() - start
+        self.metrics.record('scrape', url=url, status=response.status_code, bytes=len(response.content), fetch_seconds=fetch_seconds, parse_seconds=parse_seconds, rows=len(df))
+
+        if self.store is not None:
+            self.store_page(url, output_dir, df)
+
+        # save dataframe if `to_csv` is True
+        if to_csv:
+            df.to_csv(csv_path, index=False)
+            if response.status_code != 304:
+                # a 304 response may not repeat the validators of the cached page
+                self.store_validators(url, response)
+            if resume:
+                self.update_checkpoint(add=[url])
+
+        return df
+        
 
-        print(f"Scraped wage price data with {len(wage_errors)} errors.")
+    def rebuild_from_cache(self, urls=None, to_csv=True, return_dfs=False):
+        """
+        Parse the cached HTML of every page in the raw HTML cache again with the selected parser, without any network access. Optionally rewrite each page's CSV file, to the same path `self.scrape` saves it to. Pages are also written into `self.store` if there is one.
 
-        # scrape wage to cereal price data
-        wtc_dfs = []
-        wtc_errors = []
-        for year in range(self.start_year, self.end_year, 1):
+        ARGUMENTS:
 
-            # try to scrape first half of year
-            first_half = f'{market_url}/tot_wage/28-Jun-{year}'
-            try:
-                wtc_dfs.append(self.scrape(first_half, to_csv=to_csv, output_dir='markets/wage-to-cereal'))
-            except Exception as e:
-                wtc_errors.append(e)
-            
-            # try to scrape second half of year
-            second_half = f'{market_url}/tot_wage/28-Dec-{year}'
-            try:
-                wtc_dfs.append(self.scrape(second_half, to_csv=to_csv, output_dir='markets/wage-to-cereal'))
-            except Exception as e:
-                wtc_errors.append(e)
+        `urls`:
+            Optional collection of URLs. If passed, only cached pages with these URLs are rebuilt.
 
-        print(f"Scraped wage to cereal data with {len(wtc_errors)} errors.")
+        `to_csv`:
+            A flag indicating whether to save each DataFrame to its CSV file.
 
-        # scrape goat to cereal price data
-        gtc_dfs = []
-        gtc_errors = []
-        for year in range(self.start_year, self.end_year, 1):
+        `return_dfs`:
+            If `True` returns the DataFrames as well.
 
-            # try to scrape first half of year
-            first_half = f'{market_url}/tot_goat/28-Jun-{year}'
-            try:
-                gtc_dfs.append(self.scrape(first_half, to_csv=to_csv, output_dir='markets/goat-to-cereal'))
-            except Exception as e:
-                gtc_errors.append(e)
-            
-            # try to scrape second half of year
-            second_half = f'{market_url}/tot_goat/28-Dec-{year}'
-            try:
-                gtc_dfs.append(self.scrape(second_half, to_csv=to_csv, output_dir='markets/goat-to-cereal'))
-            except Exception as e:
-                gtc_errors.append(e)
+        RETURNS:
+            A dict of errors keyed by URL, for pages that could not be parsed. If `return_dfs` is True, a `(dfs, errors)` tuple with a dict of DataFrames keyed by URL.
 
-        print(f"Scraped goat to cereal data with {len(gtc_errors)} errors.")
+        """
 
-        # scrape cost of minimum basket price data
-        cmb_dfs = []
-        cmb_errors = []
-        for year in range(self.start_year, self.end_year, 1):
+        if self.cache_dir is None:
+            raise ValueError('The raw HTML cache is disabled, pass a `cache_dir` to use it.')
 
-            # try to scrape first half of year
-            first_half = f'{market_url}/cmb/28-Jun-{year}'
+        dfs = {}
+        errors = {}
+        rebuilt = 0
+        for url, entry in sorted(self.cache_index.items()):
+            if urls is not None and url not in urls:
+                continue
+            rebuilt += 1
             try:
-                cmb_dfs.append(self.scrape(first_half, to_csv=to_csv, output_dir='markets/cost-min-basket'))
+                df = self.parse_page(self.cached_html(url))
             except Exception as e:
-                cmb_errors.append(e)
-            
-            # try to scrape second half of year
-            second_half = f'{market_url}/cmb/28-Dec-{year}'
-            try:
-                cmb_dfs.append(self.scrape(second_half, to_csv=to_csv, output_dir='markets/cost-min-basket'))
-            except Exception as e:
-                cmb_errors.append(e)
-
-        print(f"Scraped cost of minimum basketn price data with {len(cmb_errors)} errors.")
+                errors[url] = e
+                continue
 
-
-        errors = {
-            'maize': maize_errors,
-            'sorghum': sorgum_errors,
-            'rice': rice_errors,
-            'goat': goat_errors,
-            'wage': wage_errors,
-            'wtc': wtc_errors,
-            'gtc': gtc_errors,
-            'cmb': cmb_errors,
-        }
-        
+            if to_csv:
+                csv_path = self.csv_path(url, entry['output_dir'])
+                os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+                df.to_csv(csv_path, index=False)
+            if self.store is not None:
+                self.store_page(url, entry['output_dir'], df)
+            if return_dfs:
+                dfs[url] = df
+
+        print(f"Rebuilt {rebuilt} pages from the cache with {len(errors)} errors.")
         if return_dfs:
-            dfs = {
-                'maize': maize_dfs,
-                'sorghum': sorghum_dfs,
-                'rice': rice_dfs,
-                'goat': goat_dfs,
-                'wage': wage_dfs,
-                'wtc': wtc_dfs,
-                'gtc': gtc_dfs,
-                'cmb': cmb_dfs,
-            }
             return dfs, errors
         else:
             return errors
 
 
-    def scrape_climate(self, to_csv=True, return_dfs=False):
+    def scrape_movement(self, to_csv=True, return_dfs=False):
         """
-        Scrape data from all climate related pages for 2015 onwards. Optionally save to a CSV file and return the DataFrame.
+        Scrape data for population movements (arrivals and departures) for all available years. Optionally save to a CSV file and return the DataFrame.
 
         ARGUMENTS:
 
@@ -430,115 +649,58 @@ class FSNAUScraper():
         
         """
 
-        # base climate data URL
-        climate_url = f'{self.base_url}/climate'
+        return self.scrape_category('movement', to_csv=to_csv, return_dfs=return_dfs)
 
-        # scrape combined drought index (CDI) data
-        cdi_dfs = []
-        cdi_errors = []
-        for year in range(self.start_year, self.end_year, 1):
 
-            # try to scrape first half of year
-            first_half = f'{climate_url}/cdi/28-Jun-{year}'
-            try:
-                cdi_dfs.append(self.scrape(first_half, to_csv=to_csv, output_dir='climate/cdi'))
-            except Exception as e:
-                cdi_errors.append(e)
+    def scrape_market(self, to_csv=True, return_dfs=False):
+        """
+        Scrape data for market prices (maize, sorghum, rice, goat, wage,) for 2015 onwards. Optionally save to a CSV file and return the DataFrame.
+
+        ARGUMENTS:
+
+        `to_csv`:
+            A flag indicating whether to save the DataFrame to a CSV file.
             
-            # try to scrape second half of year
-            second_half = f'{climate_url}/cdi/28-Dec-{year}'
-            try:
-                cdi_dfs.append(self.scrape(second_half, to_csv=to_csv, output_dir='climate/cdi'))
-            except Exception as e:
-                cdi_errors.append(e)
+            If `to_csv` is set to True, saves scraped data to a CSV file in 'data/climate/output_dir' directory. The filename is the part of the URL after '.org'. For example, 'https://dashboard.fsnau.org/population/arrivals' will save to data/population-arrivals.csv.
 
-        print(f"Scraped CDI (drought) data with {len(cdi_errors)} errors.")
+        `return_dfs`:
+            If `True` returns the DataFrame as well.
 
+        `return_errors`:
+            If `True` returns the errors if any.
 
-        # scrape vegetation cover index (NDVI) data
-        ndvi_dfs = []
-        ndvi_errors = []
-        for year in range(self.start_year, self.end_year, 1):
+        RETURNS:
+            Optionally a DataFrame with the scraped data. Always return any error codes from failed scrape attempts.
+        
+        """
 
-            # try to scrape first half of year
-            first_half = f'{climate_url}/ndvi/28-Jun-{year}'
-            try:
-                ndvi_dfs.append(self.scrape(first_half, to_csv=to_csv, output_dir='climate/ndvi'))
-            except Exception as e:
-                ndvi_errors.append(e)
-            
-            # try to scrape second half of year
-            second_half = f'{climate_url}/ndvi/28-Dec-{year}'
-            try:
-                ndvi_dfs.append(self.scrape(second_half, to_csv=to_csv, output_dir='climate/ndvi'))
-            except Exception as e:
-               ndvi_errors.append(e)
+        return self.scrape_category('market', to_csv=to_csv, return_dfs=return_dfs)
 
-        print(f"Scraped NDVI (vegetation) data with {len(ndvi_errors)} errors.")
 
+    def scrape_climate(self, to_csv=True, return_dfs=False):
+        """
+        Scrape data from all climate related pages for 2015 onwards. Optionally save to a CSV file and return the DataFrame.
 
-        # scrape rainfall data
-        rainfall_dfs = []
-        rainfall_errors = []
-        for year in range(self.start_year, self.end_year, 1):
+        ARGUMENTS:
 
-            # try to scrape first half of year
-            first_half = f'{climate_url}/rainfall/28-Jun-{year}'
-            try:
-               rainfall_dfs.append(self.scrape(first_half, to_csv=to_csv, output_dir='climate/rainfall'))
-            except Exception as e:
-                rainfall_errors.append(e)
+        `to_csv`:
+            A flag indicating whether to save the DataFrame to a CSV file.
             
-            # try to scrape second half of year
-            second_half = f'{climate_url}/rainfall/28-Dec-{year}'
-            try:
-                rainfall_dfs.append(self.scrape(second_half, to_csv=to_csv, output_dir='climate/rainfall'))
-            except Exception as e:
-                rainfall_errors.append(e)
+            If `to_csv` is set to True, saves scraped data to a CSV file in 'data/climate/output_dir' directory. The filename is the part of the URL after '.org'. For example, 'https://dashboard.fsnau.org/population/arrivals' will save to data/population-arrivals.csv.
 
-        print(f"Scraped Rainfall data with {len(rainfall_errors)} errors.")
+        `return_dfs`:
+            If `True` returns the DataFrame as well.
 
+        `return_errors`:
+            If `True` returns the errors if any.
 
-        # scrape water price (wp) data
-        wp_dfs = []
-        wp_errors = []
-        for year in range(self.start_year, self.end_year, 1):
-    
-            # try to scrape first half of year
-            first_half = f'{climate_url}/price-of-water/28-Jun-{year}'
-            try:
-               wp_dfs.append(self.scrape(first_half, to_csv=to_csv, output_dir='climate/water-price'))
-            except Exception as e:
-                wp_errors.append(e)
-            
-            # try to scrape second half of year
-            second_half = f'{climate_url}/price-of-water/28-Dec-{year}'
-            try:
-                wp_dfs.append(self.scrape(second_half, to_csv=to_csv, output_dir='climate/water-price'))
-            except Exception as e:
-                wp_errors.append(e)
+        RETURNS:
+            Optionally a DataFrame with the scraped data. Always return any error codes from failed scrape attempts.
+        
+        """
 
-        print(f"Scraped Water Price data with {len(wp_errors)} errors.")
+        return self.scrape_category('climate', to_csv=to_csv, return_dfs=return_dfs)
 
-        errors = {
-            'cdi': cdi_errors,
-            'ndvi': ndvi_errors,
-            'rainfall': rainfall_errors,
-            'wp': wp_errors
-        }
-        
-        if return_dfs:
-            dfs = {
-                'cdi': cdi_dfs,
-                'ndvi': ndvi_dfs,
-                'rainfall': rainfall_dfs,
-                'wp': wp_dfs
-            }
-            
-            return dfs, errors
-        else:
-            return errors
-        
 
     def scrape_nutrition(self, to_csv=True, return_dfs=False):
         """
@@ -562,46 +724,37 @@ class FSNAUScraper():
         
         """
 
-        # base climate data URL
-        nutrition_url = f'{self.base_url}/nutrition/gam'
+        return self.scrape_category('nutrition', to_csv=to_csv, return_dfs=return_dfs)
 
-        # scrape malnutrition data
-        nutrition_dfs = []
-        nutrition_errors = []
-        for year in range(self.start_year + 1, self.end_year, 1):
 
-            # try to scrape first half of year
-            first_half = f'{nutrition_url}/28-Jun-{year}'
-            try:
-                nutrition_dfs.append(self.scrape(first_half, to_csv=to_csv, output_dir='malnutrition'))
-            except Exception as e:
-                nutrition_errors.append(e)
+    def scrape_health(self, to_csv=True, return_dfs=False):
+        """
+        Scrape data for health issues (cholera, measles, malaria) for 2015 onwards. Optionally save to a CSV file and return the DataFrame.
+
+        ARGUMENTS:
+
+        `to_csv`:
+            A flag indicating whether to save the DataFrame to a CSV file.
             
-            # try to scrape second half of year
-            second_half = f'{nutrition_url}/28-Dec-{year}'
-            try:
-                nutrition_dfs.append(self.scrape(second_half, to_csv=to_csv, output_dir='malnutrition'))
-            except Exception as e:
-                nutrition_errors.append(e)
+            If `to_csv` is set to True, saves scraped data to a CSV file in 'data/climate/output_dir' directory. The filename is the part of the URL after '.org'. For example, 'https://dashboard.fsnau.org/population/arrivals' will save to data/population-arrivals.csv.
+
+        `return_dfs`:
+            If `True` returns the DataFrame as well.
 
-        print(f"Scraped malnutrition data with {len(nutrition_errors)} errors.")
+        `return_errors`:
+            If `True` returns the errors if any.
 
-        errors = {
-            'malnutrition': nutrition_errors,
-        }
+        RETURNS:
+            Optionally a DataFrame with the scraped data. Always return any error codes from failed scrape attempts.
         
-        if return_dfs:
-            dfs = {
-                'malnutrition': nutrition_dfs,
-            }
-            return dfs, errors
-        else:
-            return errors
+        """
 
+        return self.scrape_category('health', to_csv=to_csv, return_dfs=return_dfs)
 
-    def scrape_health(self, to_csv=True, return_dfs=False):
+
+    def scrape_conflicts(self, to_csv=True, return_dfs=False):
         """
-        Scrape data for health issues (cholera, measles, malaria) for 2015 onwards. Optionally save to a CSV file and return the DataFrame.
+        Scrape data for violent conflicts (incidents and fatalities) for 2015 onwards. Optionally save to a CSV file and return the DataFrame.
 
         ARGUMENTS:
 
@@ -621,191 +774,222 @@ class FSNAUScraper():
         
         """
 
-        # base climate data URL
-        health_url = f'{self.base_url}/health'
+        return self.scrape_category('conflicts', to_csv=to_csv, return_dfs=return_dfs)
 
-        # scrape cholera cases data
-        cholera_cases_dfs = []
-        cholera_cases_errors = []
-        for year in range(self.start_year, self.end_year, 1):
 
-            # try to scrape first half of year
-            first_half = f'{health_url}/awd/28-Jun-{year}'
-            try:
-                cholera_cases_dfs.append(self.scrape(first_half, to_csv=to_csv, output_dir='health/cholera-cases'))
-            except Exception as e:
-                cholera_cases_errors.append(e)
-            
-            # try to scrape second half of year
-            second_half = f'{health_url}/awd/28-Dec-{year}'
-            try:
-                cholera_cases_dfs.append(self.scrape(second_half, to_csv=to_csv, output_dir='health/cholera-cases'))
-            except Exception as e:
-                cholera_cases_errors.append(e)
+    def page_urls(self, indicator: Indicator) -> list:
+        """
+        Return the URLs of every half year snapshot of `indicator` from `self.start_year` (plus the indicator's `start_offset`) to `self.end_year`, limited to the indicator's own year range if it has one. URLs are ordered by year, first half before second half.
+        """
 
-        print(f"Scraped cholera cases data with {len(cholera_cases_errors)} errors.")
+        start_year = max(self.start_year + indicator.start_offset, indicator.start_year or self.start_year)
+        end_year = min(self.end_year, indicator.end_year or self.end_year)
 
-        # scrape cholera deaths data
-        cholera_deaths_dfs = []
-        cholera_deaths_errors = []
-        for year in range(self.start_year, self.end_year, 1):
+        urls = []
+        for year in range(start_year, end_year, 1):
+            urls.append(f'{self.base_url}/{indicator.path}/28-Jun-{year}')
+            urls.append(f'{self.base_url}/{indicator.path}/28-Dec-{year}')
+        return urls
 
-            # try to scrape first half of year
-            first_half = f'{health_url}/awd-deaths/28-Jun-{year}'
-            try:
-                cholera_deaths_dfs.append(self.scrape(first_half, to_csv=to_csv, output_dir='health/cholera-deaths'))
-            except Exception as e:
-                cholera_deaths_errors.append(e)
-            
-            # try to scrape second half of year
-            second_half = f'{health_url}/awd-deaths/28-Dec-{year}'
-            try:
-                cholera_deaths_dfs.append(self.scrape(second_half, to_csv=to_csv, output_dir='health/cholera-deaths'))
-            except Exception as e:
-                cholera_deaths_errors.append(e)
 
-        print(f"Scraped cholera death data with {len(cholera_deaths_errors)} errors.")
+    def scrape_indicator(self, indicator: Indicator, to_csv=True, resume=False) -> tuple:
+        """
+        Scrape every half year page of `indicator` one after another. Optionally save each page to a CSV file in the indicator's output directory. `resume` is passed to `self.scrape`.
 
-        # scrape measles cases data
-        measles_dfs = []
-        measles_errors = []
-        for year in range(self.start_year, self.end_year, 1):
+        RETURNS:
+            A `(dfs, errors)` tuple with the DataFrames of the pages that were scraped and the errors of those that failed.
+        """
 
-            # try to scrape first half of year
-            first_half = f'{health_url}/measles/28-Jun-{year}'
+        dfs = []
+        errors = []
+        for url in self.page_urls(indicator):
             try:
-                measles_dfs.append(self.scrape(first_half, to_csv=to_csv, output_dir='health/measles'))
+                dfs.append(self.scrape(url, to_csv=to_csv, output_dir=indicator.output_dir, resume=resume))
             except Exception as e:
-                measles_errors.append(e)
-            
-            # try to scrape second half of year
-            second_half = f'{health_url}/measles/28-Dec-{year}'
-            try:
-                measles_dfs.append(self.scrape(second_half, to_csv=to_csv, output_dir='health/measles'))
-            except Exception as e:
-                measles_errors.append(e)
+                errors.append(e)
 
-        print(f"Scraped measles cases data with {len(measles_errors)} errors.")
+        print(f"Scraped {indicator.value_name} data with {len(errors)} errors.")
+        return dfs, errors
 
-        # scrape malaria cases data
-        malaria_dfs = []
-        malaria_errors = []
-        for year in range(self.start_year, self.end_year, 1):
 
-            # try to scrape first half of year
-            first_half = f'{health_url}/malaria/28-Jun-{year}'
-            try:
-                malaria_dfs.append(self.scrape(first_half, to_csv=to_csv, output_dir='health/malaria'))
-            except Exception as e:
-                malaria_errors.append(e)
-            
-            # try to scrape second half of year
-            second_half = f'{health_url}/malaria/28-Dec-{year}'
-            try:
-                malaria_dfs.append(self.scrape(second_half, to_csv=to_csv, output_dir='health/malaria'))
-            except Exception as e:
-                malaria_errors.append(e)
+    def scrape_category(self, category: str, to_csv=True, return_dfs=False):
+        """
+        Scrape every registered indicator of `category` (see `indicators.INDICATORS`). Optionally save to CSV files and return the DataFrames.
 
-        print(f"Scraped malaria cases data with {len(malaria_errors)} errors.")
+        RETURNS:
+            A dict of errors keyed by indicator. If `return_dfs` is True, a `(dfs, errors)` tuple with a dict of DataFrames keyed the same way.
+        """
 
+        dfs = {}
+        errors = {}
+        for indicator in get_indicators(category):
+            dfs[indicator.key], errors[indicator.error_key or indicator.key] = self.scrape_indicator(indicator, to_csv=to_csv, resume=True)
+
+        # the category is complete, a later scrape should fetch it again
+        if not any(transient_error(error) for indicator_errors in errors.values() for error in indicator_errors):
+            self.update_checkpoint(remove=[url for indicator in get_indicators(category) for url in self.page_urls(indicator)])
 
-        errors = {
-            'cholera_cases': cholera_cases_errors,
-            'cholera_deaths': cholera_deaths_errors,
-            'measles': measles_errors,
-            'malaria': malaria_errors
-        }
-        
         if return_dfs:
-            dfs = {
-                'cholera_cases': cholera_cases_dfs,
-            'cholera_deaths': cholera_deaths_dfs,
-            'measles': measles_dfs,
-            'malaria': malaria_dfs
-            }
             return dfs, errors
         else:
             return errors
 
 
-    def scrape_conflicts(self, to_csv=True, return_dfs=False):
+    async def crawl(self, categories=None, to_csv=True, return_dfs=False, max_in_flight=8, requests_per_second=None, urls=None) -> dict:
         """
-        Scrape data for violent conflicts (incidents and fatalities) for 2015 onwards. Optionally save to a CSV file and return the DataFrame.
+        Scrape every page of the passed categories concurrently. All URLs are queued up front and fetched by a pool of `max_in_flight` workers.
 
         ARGUMENTS:
 
+        `categories`:
+            Names of the categories to scrape, any of 'movement', 'market', 'climate', 'nutrition', 'health' and 'conflicts'. Defaults to all of them.
+
         `to_csv`:
-            A flag indicating whether to save the DataFrame to a CSV file.
-            
-            If `to_csv` is set to True, saves scraped data to a CSV file in 'data/climate/output_dir' directory. The filename is the part of the URL after '.org'. For example, 'https://dashboard.fsnau.org/population/arrivals' will save to data/population-arrivals.csv.
+            A flag indicating whether to save each DataFrame to a CSV file, as in `self.scrape`.
 
         `return_dfs`:
-            If `True` returns the DataFrame as well.
+            If `True` returns the DataFrames as well.
 
-        `return_errors`:
-            If `True` returns the errors if any.
+        `max_in_flight`:
+            Maximum number of requests in flight at once. The session's connection pool is enlarged to match if it is smaller.
+
+        `requests_per_second`:
+            Maximum number of requests started per second against any single host. Defaults to no limit.
+
+        `urls`:
+            Optional collection of URLs. If passed, only pages with these URLs are scraped.
 
         RETURNS:
-            Optionally a DataFrame with the scraped data. Always return any error codes from failed scrape attempts.
-        
+            A dict keyed by category. Each value is what the matching `scrape_*` method returns: the errors dict, or a `(dfs, errors)` tuple if `return_dfs` is True.
+
         """
 
-        # base climate data URL
-        conflicts_url = f'{self.base_url}/insecurity'
+        if categories is None:
+            categories = CATEGORIES
 
-        # scrape violent conflict incident data
-        incidents_dfs = []
-        incidents_errors = []
-        for year in range(self.start_year, self.end_year, 1):
+        # every request in flight keeps its connection alive
+        if max_in_flight > self.pool_size:
+            self.mount_adapter(max_in_flight)
 
-            # try to scrape first half of year
-            first_half = f'{conflicts_url}/incidents/28-Jun-{year}'
-            try:
-                incidents_dfs.append(self.scrape(first_half, to_csv=to_csv, output_dir='conflicts/incidents'))
-            except Exception as e:
-                incidents_errors.append(e)
-            
-            # try to scrape second half of year
-            second_half = f'{conflicts_url}/incidents/28-Dec-{year}'
-            try:
-                incidents_dfs.append(self.scrape(second_half, to_csv=to_csv, output_dir='conflicts/fatalitites'))
-            except Exception as e:
-                incidents_errors.append(e)
+        semaphore = asyncio.Semaphore(max_in_flight)
+        limiter = _HostRateLimiter(requests_per_second)
+        loop = asyncio.get_running_loop()
 
-        print(f"Scraped conflict incident data with {len(incidents_errors)} errors.")
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
 
-        # scrape violent conflict fatality data
-        fatalities_dfs = []
-        fatalities_errors = []
-        for year in range(self.start_year, self.end_year, 1):
+            async def fetch(url, output_dir):
+                async with semaphore:
+                    await limiter.wait(url)
+                    return await loop.run_in_executor(executor, partial(self.scrape, url, to_csv=to_csv, output_dir=output_dir, resume=True))
 
-            # try to scrape first half of year
-            first_half = f'{conflicts_url}/fatalities/28-Jun-{year}'
-            try:
-                fatalities_dfs.append(self.scrape(first_half, to_csv=to_csv, output_dir='conflicts/fatalities'))
-            except Exception as e:
-                fatalities_errors.append(e)
-            
-            # try to scrape second half of year
-            second_half = f'{conflicts_url}/fatalities/28-Dec-{year}'
-            try:
-                fatalities_dfs.append(self.scrape(second_half, to_csv=to_csv, output_dir='conflicts/fatalitites'))
-            except Exception as e:
-                fatalities_errors.append(e)
+            # queue every page of every category before waiting on any of them
+            tasks = {}
+            for category in categories:
+                for indicator in get_indicators(category):
+                    page_urls = [url for url in self.page_urls(indicator) if urls is None or url in urls]
+                    tasks[indicator] = [asyncio.ensure_future(fetch(url, indicator.output_dir)) for url in page_urls]
 
-        print(f"Scraped conflict fatality data with {len(fatalities_errors)} errors.")
+            # collect results in the same order and shape as the `scrape_*` methods
+            results = {}
+            failed = False
+            for category in categories:
+                dfs = {}
+                errors = {}
+                for indicator in get_indicators(category):
+                    outcomes = await asyncio.gather(*tasks[indicator], return_exceptions=True)
+                    error_key = indicator.error_key or indicator.key
+                    dfs[indicator.key] = [outcome for outcome in outcomes if not isinstance(outcome, Exception)]
+                    errors[error_key] = [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+                    failed = failed or any(transient_error(error) for error in errors[error_key])
+                    print(f"Scraped {indicator.value_name} data with {len(errors[error_key])} errors.")
 
-        errors = {
-            'incident': incidents_errors,
-            'fatality': fatalities_errors
-        }
-        
-        if return_dfs:
-            dfs = {
-                'incidents': incidents_dfs,
-                'fatalities': fatalities_dfs
-            }
-            return dfs, errors
-        else:
-            return errors
+                results[category] = (dfs, errors) if return_dfs else errors
+
+        # the crawl is complete, a later crawl should fetch its pages again
+        if not failed:
+            self.update_checkpoint(remove=[url for indicator in tasks for url in self.page_urls(indicator)])
+
+        return results
+
+
+    def scrape_concurrent(self, categories=None, to_csv=True, return_dfs=False, max_in_flight=8, requests_per_second=None, urls=None) -> dict:
+        """
+        Run `self.crawl` to completion and return its results. Takes the same arguments as `self.crawl`.
+
+        Inside a running event loop (e.g. a Jupyter notebook) use `await self.crawl(...)` instead.
+        """
+
+        return asyncio.run(self.crawl(categories, to_csv=to_csv, return_dfs=return_dfs, max_in_flight=max_in_flight, requests_per_second=requests_per_second, urls=urls))
+
+
+    def manifest(self, categories=None, settle_days=30) -> pd.DataFrame:
+        """
+        List every half year page of the passed categories from `self.start_year` to `self.end_year` and check it against the CSV files already saved under `self.data_dir`.
+
+        ARGUMENTS:
+
+        `categories`:
+            Names of the categories to check, as in `self.crawl`. Defaults to all of them.
+
+        `settle_days`:
+            Number of days after a snapshot date (28 Jun or 28 Dec) during which the dashboard may still revise that half year. A CSV file saved before then is considered stale.
+
+        RETURNS:
+            A DataFrame with one row per page: its category, key, output directory, year, half, snapshot date, URL, CSV path and status. The status is 'missing' if no CSV file exists, 'stale' if it was saved before the half year settled and 'current' otherwise.
+
+        """
+
+        if categories is None:
+            categories = CATEGORIES
+
+        rows = []
+        for category in categories:
+            for indicator in get_indicators(category):
+                for url in self.page_urls(indicator):
+                    snapshot = datetime.strptime(url.rsplit('/', 1)[-1], '%d-%b-%Y')
+                    csv_path = self.csv_path(url, indicator.output_dir)
+
+                    if not os.path.exists(csv_path):
+                        status = 'missing'
+                    elif datetime.fromtimestamp(os.path.getmtime(csv_path)) < snapshot + timedelta(days=settle_days):
+                        status = 'stale'
+                    else:
+                        status = 'current'
+
+                    rows.append({
+                        'category': category,
+                        'key': indicator.key,
+                        'output_dir': indicator.output_dir,
+                        'year': snapshot.year,
+                        'half': snapshot.strftime('%b'),
+                        'snapshot': snapshot,
+                        'url': url,
+                        'path': csv_path,
+                        'status': status,
+                    })
+
+        return pd.DataFrame(rows, columns=['category', 'key', 'output_dir', 'year', 'half', 'snapshot', 'url', 'path', 'status'])
+
+
+    def scrape_incremental(self, categories=None, settle_days=30, to_csv=True, return_dfs=False, max_in_flight=1, requests_per_second=None) -> dict:
+        """
+        Scrape only the pages that `self.manifest` reports as missing or stale, leaving current CSV files untouched.
+
+        ARGUMENTS:
+
+        `categories` and `settle_days`:
+            Passed to `self.manifest`.
+
+        `to_csv`, `return_dfs`, `max_in_flight` and `requests_per_second`:
+            Passed to `self.crawl`. Pages are scraped one at a time by default.
+
+        RETURNS:
+            The same dict as `self.crawl`, covering only the scraped pages.
+
+        """
+
+        manifest = self.manifest(categories, settle_days=settle_days)
+        outdated = manifest[manifest['status'] != 'current']
+        print(f"Found {len(outdated)} missing or stale pages out of {len(manifest)}.")
 
+        return self.scrape_concurrent(categories, to_csv=to_csv, return_dfs=return_dfs, max_in_flight=max_in_flight, requests_per_second=requests_per_second, urls=set(outdated['url']))
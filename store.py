@@ -0,0 +1,162 @@
+"""
+Consolidated SQLite store of every scraped indicator value, as an alternative to one small CSV file per dashboard page.
+
+Values are kept in long format, one row per (indicator, district, year, month), in a single `observations` table. Writing a page upserts its rows: a value from a newer half year snapshot replaces the stored one, an older snapshot never overwrites a newer one. Each district month therefore holds the most recent value published, as in the Aggregator's index assembly.
+
+Pass a `SQLiteStore` as the `store` argument of `FSNAUScraper` to write every scraped page into it, and as the `store` argument of `Aggregator` to read indicators from it instead of listing and parsing CSV files. `SQLiteStore.import_csv` fills a store from an existing CSV data directory.
+"""
+
+import os
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from aggregator import Aggregator, KEY_DTYPES, snapshot_date, to_long
+from indicators import Indicator, get_indicators
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    indicator TEXT NOT NULL,
+    region TEXT NOT NULL,
+    district TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    value REAL,
+    snapshot TEXT NOT NULL,
+    PRIMARY KEY (indicator, district, year, month)
+) WITHOUT ROWID
+"""
+
+# newer snapshots replace stored values, older ones are ignored
+UPSERT = """
+INSERT INTO observations (indicator, region, district, year, month, value, snapshot)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (indicator, district, year, month) DO UPDATE SET
+    region = excluded.region,
+    value = excluded.value,
+    snapshot = excluded.snapshot
+WHERE excluded.snapshot >= observations.snapshot
+"""
+
+
+class SQLiteStore():
+    """
+    Consolidated store of long format indicator values in the SQLite database file at `path`, upserted on (indicator, district, year, month).
+
+    Safe to share between the threads of a concurrent crawl: every call opens its own connection and writes are serialized.
+    """
+
+    def __init__(self, path='data/indicators.sqlite') -> None:
+        self.path = path
+        self.lock = threading.Lock()
+
+        store_dir = os.path.dirname(path)
+        if store_dir and not os.path.exists(store_dir):
+            os.makedirs(store_dir)
+        with self.connect() as connection:
+            connection.execute(SCHEMA)
+
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Open a new connection to the database. Used as a context manager it commits on success and rolls back on error, but stays open.
+        """
+
+        return sqlite3.connect(self.path, timeout=30)
+
+
+    def upsert(self, indicator: Indicator, df_long, snapshot: datetime) -> int:
+        """
+        Write the long format DataFrame `df_long` (key columns and the indicator's value column, as returned by `aggregator.to_long`) for `indicator`, taken from the half year snapshot `snapshot`. Return the number of rows written.
+        """
+
+        values = df_long[indicator.value_name].astype('float64').to_numpy()
+        rows = zip(
+            [indicator.key] * len(df_long),
+            df_long['Region'].astype(str),
+            df_long['District'].astype(str),
+            df_long['Year'].astype(int).tolist(),
+            (df_long['Month'].cat.codes + 1).tolist(),
+            [None if np.isnan(value) else float(value) for value in values],
+            [snapshot.strftime('%Y-%m-%d')] * len(df_long),
+        )
+
+        with self.lock:
+            connection = self.connect()
+            try:
+                with connection:
+                    connection.executemany(UPSERT, rows)
+            finally:
+                connection.close()
+
+        return len(df_long)
+
+
+    def upsert_page(self, indicator: Indicator, page_df, snapshot: datetime) -> int:
+        """
+        Write a dashboard page `page_df`, as returned by `FSNAUScraper.scrape` (wide format, with the '#' column and the empty row below the header), for `indicator`. Return the number of rows written.
+        """
+
+        page_df = page_df.drop(columns='#').dropna(subset=['District'])
+        return self.upsert(indicator, to_long(page_df, indicator.value_name, indicator.dtype), snapshot)
+
+
+    def import_csv(self, data_dir='data', indicators=None) -> int:
+        """
+        Write every CSV file of `indicators` (defaults to all registered indicators) in `data_dir` into the store, oldest snapshot first. Return the number of rows written.
+        """
+
+        if indicators is None:
+            indicators = get_indicators()
+
+        aggregator = Aggregator(data_dir=data_dir)
+        written = 0
+        for indicator in indicators:
+            if not os.path.exists(os.path.join(data_dir, indicator.output_dir)):
+                continue
+            for file_path in aggregator.indicator_files(indicator):
+                df_long = aggregator.load_dataframe(file_path, indicator.value_name, indicator.dtype)
+                written += self.upsert(indicator, df_long, snapshot_date(os.path.basename(file_path)))
+
+        return written
+
+
+    def read(self, indicator: Indicator, years=None):
+        """
+        Return the stored values of `indicator` as a long format DataFrame with the same columns and types as `Aggregator.load_dataframe`, ordered by year, month, region and district. Optionally only the rows of `years`.
+        """
+
+        query = 'SELECT region, district, value, month, year FROM observations WHERE indicator = ?'
+        params = [indicator.key]
+        if years is not None:
+            years = sorted(set(years))
+            query += f" AND year IN ({', '.join('?' * len(years))})"
+            params += years
+        query += ' ORDER BY year, month, region, district'
+
+        connection = self.connect()
+        try:
+            rows = connection.execute(query, params).fetchall()
+        finally:
+            connection.close()
+
+        regions, districts, values, months, row_years = zip(*rows) if rows else ([], [], [], [], [])
+        return pd.DataFrame({
+            'Region': pd.Series(regions, dtype=object).astype(KEY_DTYPES['Region']),
+            'District': pd.Series(districts, dtype=object).astype(KEY_DTYPES['District']),
+            indicator.value_name: pd.Series(values, dtype='float64').astype(indicator.dtype),
+            'Month': pd.Categorical.from_codes(np.array(months, dtype='int8') - 1, dtype=KEY_DTYPES['Month']),
+            'Year': np.array(row_years, dtype=KEY_DTYPES['Year']),
+        })
+
+
+    def fingerprint(self) -> str:
+        """
+        Return a hash of the database file's contents. Changes whenever the stored values do.
+        """
+
+        with self.lock, open(self.path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
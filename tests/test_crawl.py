@@ -0,0 +1,80 @@
+"""
+Check that `FSNAUScraper.crawl` returns the same DataFrames and errors as the sequential `scrape_*` methods, against a local stand-in for the dashboard serving pages rendered from the checked-in CSV files.
+
+Run with `python -m pytest tests` from the repository root.
+"""
+
+import os
+import filecmp
+import pytest
+import pandas as pd
+from benchmark import render_fixtures, serve_fixtures
+from indicators import CATEGORIES
+from scraper import FSNAUScraper
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+
+@pytest.fixture(scope='module')
+def base_url(tmp_path_factory):
+    fixtures_dir = str(tmp_path_factory.mktemp('fixtures'))
+    render_fixtures(DATA_DIR, fixtures_dir)
+    with serve_fixtures(fixtures_dir) as url:
+        yield url
+
+
+def make_scraper(base_url, data_dir):
+    # no state kept between runs, so both scrapers fetch every page
+    return FSNAUScraper(2021, 2024, base_url=base_url, data_dir=str(data_dir), validators_path=False, checkpoint_path=False, cache_dir=False, max_retries=0)
+
+
+def saved_files(data_dir):
+    return sorted(os.path.relpath(os.path.join(root, name), data_dir) for root, _, names in os.walk(data_dir) for name in names)
+
+
+def error_summary(errors):
+    return {key: [(type(error), str(error)) for error in indicator_errors] for key, indicator_errors in errors.items()}
+
+
+def assert_same_results(sequential, concurrent):
+    sequential_dfs, sequential_errors = sequential
+    concurrent_dfs, concurrent_errors = concurrent
+
+    assert list(sequential_dfs) == list(concurrent_dfs)
+    for key in sequential_dfs:
+        assert len(sequential_dfs[key]) == len(concurrent_dfs[key])
+        for sequential_df, concurrent_df in zip(sequential_dfs[key], concurrent_dfs[key]):
+            pd.testing.assert_frame_equal(sequential_df, concurrent_df)
+    assert error_summary(sequential_errors) == error_summary(concurrent_errors)
+
+
+def test_crawl_matches_scrape_methods(base_url, tmp_path):
+    sequential = {category: make_scraper(base_url, tmp_path / 'sequential').scrape_category(category, to_csv=False, return_dfs=True) for category in CATEGORIES}
+    concurrent = make_scraper(base_url, tmp_path / 'concurrent').scrape_concurrent(to_csv=False, return_dfs=True, max_in_flight=8)
+
+    assert list(concurrent) == CATEGORIES
+    for category in CATEGORIES:
+        assert_same_results(sequential[category], concurrent[category])
+
+    # pages are found for every category but nutrition, which has no checked-in data
+    assert all(concurrent[category][0] for category in CATEGORIES if category != 'nutrition')
+
+
+def test_crawl_saves_same_csv_files(base_url, tmp_path):
+    categories = ['climate', 'market']
+    sequential_dir, concurrent_dir = tmp_path / 'sequential', tmp_path / 'concurrent'
+
+    sequential_scraper = make_scraper(base_url, sequential_dir)
+    sequential = {category: sequential_scraper.scrape_category(category, return_dfs=True) for category in categories}
+    # many workers saving pages of the same indicator into a fresh data directory at once
+    concurrent = make_scraper(base_url, concurrent_dir).scrape_concurrent(categories=categories, return_dfs=True, max_in_flight=16)
+
+    for category in categories:
+        assert_same_results(sequential[category], concurrent[category])
+        assert not any(concurrent[category][1].values())
+
+    files = saved_files(sequential_dir)
+    assert files and files == saved_files(concurrent_dir)
+    _, mismatch, errors = filecmp.cmpfiles(sequential_dir, concurrent_dir, files, shallow=False)
+    assert not mismatch and not errors
@@ -0,0 +1,84 @@
+"""
+Checks of `ArrivalsScorer` and the micro-batched scoring service, with a decision tree fitted on the checked-in data.
+"""
+
+import json
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+import pytest
+from aggregator import Aggregator
+from scoring import ArrivalsScorer, MicroBatcher, serve
+
+
+@pytest.fixture(scope='module')
+def merged():
+    return Aggregator(assembly='index').merge_data()
+
+
+@pytest.fixture(scope='module')
+def scorer(merged):
+    return ArrivalsScorer.fit(merged, name='DT')
+
+
+@pytest.fixture(scope='module')
+def rows(merged, scorer):
+    # rows without missing features, which all get a prediction
+    return merged[scorer.predict(merged)['Predicted Arrivals'].notna()].head(5)
+
+
+def post(url, records):
+    request = Request(url, data=json.dumps(records).encode('utf-8'), headers={'Content-Type': 'application/json'})
+    with urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def test_bad_request_fails_alone(scorer, rows):
+    batcher = MicroBatcher(scorer, max_wait=1)
+    try:
+        # both requests arrive within the wait and are scored in one batch
+        good = batcher.submit(rows)
+        bad = batcher.submit(rows.assign(Rainfall='n/a'))
+        assert good.result().equals(scorer.predict(rows))
+        with pytest.raises(ValueError):
+            bad.result()
+    finally:
+        batcher.close()
+
+
+def test_saved_scorer_predicts_the_same(scorer, rows, tmp_path):
+    scorer.save(str(tmp_path / 'model.pkl'))
+    loaded = ArrivalsScorer.load(str(tmp_path / 'model.pkl'))
+
+    predictions = loaded.predict(rows)
+    assert predictions.equals(scorer.predict(rows))
+    assert list(predictions.columns) == ['Region', 'District', 'Month', 'Year', 'Predicted Arrivals', 'Alarm Level']
+    assert predictions['Alarm Level'].between(1, 3).all()
+
+
+def test_predict_endpoint(scorer, rows):
+    records = json.loads(rows.to_json(orient='records'))
+    expected = scorer.predict(rows)
+
+    with serve(scorer, port=0) as url:
+        predictions = post(f'{url}/predict', records)
+        assert [row['Predicted Arrivals'] for row in predictions] == expected['Predicted Arrivals'].tolist()
+
+        for row in records:
+            row['Rainfall'] = 'n/a'
+        with pytest.raises(HTTPError) as error:
+            post(f'{url}/predict', records)
+        assert error.value.code == 400
+
+
+class BrokenScorer():
+    name = 'DT'
+
+    def predict(self, df):
+        raise RuntimeError('model file is corrupt')
+
+
+def test_predict_endpoint_server_error(rows):
+    with serve(BrokenScorer(), port=0) as url:
+        with pytest.raises(HTTPError) as error:
+            post(f'{url}/predict', json.loads(rows.to_json(orient='records')))
+        assert error.value.code == 500
@@ -0,0 +1,101 @@
+"""
+Checks of `FSNAUScraper.scrape` state kept between runs (the checkpoint), against a local server whose pages can be changed.
+"""
+
+import os
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer
+import pytest
+from benchmark import _FixtureRequestHandler
+from indicators import get_indicators
+from scraper import FSNAUScraper
+from store import SQLiteStore
+
+
+RAINFALL = next(indicator for indicator in get_indicators('climate') if indicator.key == 'rainfall')
+
+PAGE = '<html><body><table><tr><th>#</th><th>Region</th><th>District</th><th>Jan-2023</th></tr><tr><td>1</td><td>Awdal</td><td>Borama</td><td>{value}</td></tr></table></body></html>'
+
+
+@pytest.fixture
+def dashboard(tmp_path):
+    pages_dir = tmp_path / 'pages'
+    (pages_dir / 'climate' / 'rainfall').mkdir(parents=True)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(_FixtureRequestHandler, directory=str(pages_dir)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def set_page(value, date='28-Jun-2023'):
+        (pages_dir / 'climate' / 'rainfall' / date).write_text(PAGE.format(value=value))
+
+    yield f'http://127.0.0.1:{server.server_address[1]}', set_page
+    server.shutdown()
+    server.server_close()
+
+
+def make_scraper(base_url, tmp_path, validators_path=False, **kwargs):
+    return FSNAUScraper(2023, 2024, base_url=base_url, data_dir=str(tmp_path / 'data'), validators_path=validators_path, cache_dir=False, checkpoint_path=str(tmp_path / 'checkpoint.json'), max_retries=0, **kwargs)
+
+
+def test_single_scrape_does_not_use_checkpoint(dashboard, tmp_path):
+    base_url, set_page = dashboard
+    url = f'{base_url}/climate/rainfall/28-Jun-2023'
+
+    set_page('1.5')
+    assert make_scraper(base_url, tmp_path).scrape(url, output_dir='climate/rainfall').iloc[1]['Jan-2023'] == '1.5'
+    assert not os.path.exists(tmp_path / 'checkpoint.json')
+
+    # a changed page is fetched again, by the same or a new scraper
+    set_page('2.5')
+    assert make_scraper(base_url, tmp_path).scrape(url, output_dir='climate/rainfall').iloc[1]['Jan-2023'] == '2.5'
+
+
+def test_category_run_resumes_from_checkpoint(dashboard, tmp_path):
+    base_url, set_page = dashboard
+    set_page('1.5')
+
+    # an unfinished run: the saved page stays in the checkpoint until its whole category completes
+    scraper = make_scraper(base_url, tmp_path)
+    scraper.scrape_indicator(RAINFALL, resume=True)
+    assert os.path.exists(tmp_path / 'checkpoint.json')
+
+    # resuming the run reads the saved page back instead of fetching the changed one
+    set_page('2.5')
+    dfs, _ = make_scraper(base_url, tmp_path).scrape_indicator(RAINFALL, resume=True)
+    assert dfs[0].iloc[1]['Jan-2023'] == '1.5'
+
+
+def test_unchanged_page_is_written_to_store(dashboard, tmp_path):
+    base_url, set_page = dashboard
+    url = f'{base_url}/climate/rainfall/28-Jun-2023'
+    validators_path = str(tmp_path / 'validators.json')
+    set_page('1.5')
+    make_scraper(base_url, tmp_path, validators_path=validators_path).scrape(url, output_dir=RAINFALL.output_dir)
+
+    # the server answers 304 Not Modified, the page comes from the saved CSV file
+    store = SQLiteStore(str(tmp_path / 'indicators.sqlite'))
+    scraper = make_scraper(base_url, tmp_path, validators_path=validators_path, store=store)
+    df = scraper.scrape(url, output_dir=RAINFALL.output_dir)
+    assert df.iloc[1]['Jan-2023'] == '1.5'
+
+    stored = store.read(RAINFALL)
+    assert len(stored) == 1 and stored['Rainfall'].iloc[0] == 1.5
+
+
+def test_store_needs_registered_output_dir(dashboard, tmp_path):
+    base_url, set_page = dashboard
+    set_page('1.5')
+    scraper = make_scraper(base_url, tmp_path, store=SQLiteStore(str(tmp_path / 'indicators.sqlite')))
+    with pytest.raises(ValueError, match='No registered indicator'):
+        scraper.scrape(f'{base_url}/climate/rainfall/28-Jun-2023')
+
+
+def test_state_defaults_to_data_dir(tmp_path):
+    scraper = FSNAUScraper(2023, 2024, data_dir=str(tmp_path))
+    assert scraper.validators_path == str(tmp_path / 'http-validators.json')
+    assert scraper.checkpoint_path == str(tmp_path / 'scrape-checkpoint.json')
+    assert scraper.cache_dir == str(tmp_path / 'html-cache')
+
+    scraper = FSNAUScraper(2023, 2024, data_dir=str(tmp_path), validators_path=False, checkpoint_path=False, cache_dir=False)
+    assert (scraper.validators_path, scraper.checkpoint_path, scraper.cache_dir) == (None, None, None)